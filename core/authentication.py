@@ -0,0 +1,106 @@
+from collections import OrderedDict
+import copy
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+
+class UserCache():
+    """
+    Bounded, thread-safe LRU cache of authenticated users keyed by (user id, token id), with a TTL.
+
+    The cached instance is shared by every request of the process, callers must hand out copies.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return user
+
+    def set(self, key, user):
+        with self.lock:
+            self.entries[key] = (user, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == user_id]:
+                del self.entries[key]
+
+
+user_cache = UserCache(
+    getattr(settings, 'AUTH_USER_CACHE_SIZE', 10000),
+    getattr(settings, 'AUTH_USER_CACHE_TTL', 60),
+)
+
+
+def invalidation_key(user_id):
+    return f"auth:user-stamp:{user_id}"
+
+
+def invalidate_user(user_id):
+    """
+    Invalidate the cached authentications of a user in every process.
+
+    The entries of this process are dropped, and a new stamp is written to the Django cache:
+    the other processes see it on their next cache hit and load the user again. Called by
+    core.signals when a user is saved or deleted. QuerySet.update() sends no signal, call it
+    after updating users that way.
+    """
+    user_id = str(user_id)
+    user_cache.invalidate_user(user_id)
+    cache.set(invalidation_key(user_id), uuid.uuid4().hex, None)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication loading the user from the database once per token and TTL instead of on every request.
+
+    Entries are invalidated as soon as the user is saved or deleted (deactivation, password change,
+    ...), see invalidate_user. Every hit compares the stamp of the entry with the one in the Django
+    cache, so the other processes see the change on their next request too. That needs a cache
+    shared by the processes (Redis, Memcached, database): with the default LocMemCache, the other
+    processes only see it when their entry expires, after up to AUTH_USER_CACHE_TTL seconds.
+
+    Every request gets its own shallow copy of the cached user as request.user, so attribute changes
+    or a save() in one request never leak into the concurrent ones.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        token_id = validated_token.get(api_settings.JTI_CLAIM)
+        if user_id is None or token_id is None:
+            return super().get_user(validated_token)
+
+        key = (str(user_id), token_id)
+        # Read before loading the user: an invalidation racing with the load leaves a stale stamp
+        stamp = cache.get(invalidation_key(user_id))
+        entry = user_cache.get(key)
+        if entry is not None and entry[1] == stamp:
+            user = entry[0]
+        else:
+            # Inactive users and revoked tokens are rejected here and never cached
+            user = super().get_user(validated_token)
+            user_cache.set(key, (user, stamp))
+        # Model.__reduce__ copies _state too, the copy is independent from the cached instance
+        return copy.copy(user)
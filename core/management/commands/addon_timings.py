@@ -0,0 +1,32 @@
+from importlib import import_module
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from erp.addon_urls import urlconf_timings
+from erp.manifest import get_addons
+
+
+class Command(BaseCommand):
+    help = "Report, per addon declared in the manifest, the time spent importing its URLconf."
+
+    # The URL checks would import every addon URLconf before we can time them
+    requires_system_checks = []
+
+    def handle(self, *args, **options):
+        total = 0
+        for addon in get_addons():
+            module_name = f"{addon['name']}.urls"
+            if addon['name'] in urlconf_timings:
+                elapsed = urlconf_timings[addon['name']]
+            elif module_name in sys.modules:
+                self.stdout.write(f"{addon['name']}: URLconf already imported, not measured")
+                continue
+            else:
+                start = time.perf_counter()
+                import_module(module_name)
+                elapsed = time.perf_counter() - start
+            total += elapsed
+            self.stdout.write(f"{addon['name']}: {elapsed * 1000:.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"Total: {total * 1000:.1f} ms"))
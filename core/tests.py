@@ -1,3 +1,91 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .authentication import CachedJWTAuthentication, UserCache, invalidate_user, user_cache
+
+
+class UserCacheTests(SimpleTestCase):
+
+    def test_lru_eviction(self):
+        users = UserCache(max_size=2, ttl=60)
+        users.set(('1', 'a'), 'first')
+        users.set(('2', 'a'), 'second')
+        users.get(('1', 'a'))
+        users.set(('3', 'a'), 'third')
+        self.assertEqual(users.get(('1', 'a')), 'first')
+        self.assertIsNone(users.get(('2', 'a')))
+        self.assertEqual(users.get(('3', 'a')), 'third')
+
+    def test_expiry(self):
+        users = UserCache(max_size=2, ttl=60)
+        with mock.patch('core.authentication.time.monotonic', return_value=1000):
+            users.set(('1', 'a'), 'first')
+        with mock.patch('core.authentication.time.monotonic', return_value=1061):
+            self.assertIsNone(users.get(('1', 'a')))
+        self.assertEqual(users.entries, {})
+
+    def test_invalidate_user(self):
+        users = UserCache(max_size=10, ttl=60)
+        users.set(('1', 'a'), 'first')
+        users.set(('1', 'b'), 'first again')
+        users.set(('2', 'a'), 'second')
+        users.invalidate_user('1')
+        self.assertEqual(list(users.entries), [('2', 'a')])
+
+
+class CachedJWTAuthenticationTests(SimpleTestCase):
+
+    token = {'user_id': 7, 'jti': 'token-1'}
+
+    def setUp(self):
+        user_cache.entries.clear()
+        cache.clear()
+        self.addCleanup(user_cache.entries.clear)
+        self.loaded = []
+
+        def load(validated_token):
+            user = get_user_model()(id=7, username=f"user{len(self.loaded)}")
+            self.loaded.append(user)
+            return user
+
+        patcher = mock.patch.object(JWTAuthentication, 'get_user', side_effect=load)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_user_loaded_once_per_token(self):
+        authentication = CachedJWTAuthentication()
+        first = authentication.get_user(self.token)
+        second = authentication.get_user(self.token)
+        self.assertEqual(len(self.loaded), 1)
+        self.assertEqual((first.pk, second.pk), (7, 7))
+
+    def test_each_request_gets_its_own_copy(self):
+        authentication = CachedJWTAuthentication()
+        first = authentication.get_user(self.token)
+        first.username = 'changed'
+        first._state.db = 'other'
+        second = authentication.get_user(self.token)
+        self.assertIsNot(first, second)
+        self.assertEqual(second.username, 'user0')
+        self.assertIsNot(second._state, first._state)
+
+    def test_stamp_written_elsewhere_reloads_the_user(self):
+        authentication = CachedJWTAuthentication()
+        authentication.get_user(self.token)
+        # Another process invalidated the user: only the shared stamp changes here
+        cache.set('auth:user-stamp:7', 'other-process', None)
+        self.assertEqual(authentication.get_user(self.token).username, 'user1')
+        self.assertEqual(authentication.get_user(self.token).username, 'user1')
+        self.assertEqual(len(self.loaded), 2)
+
+    def test_invalidate_user(self):
+        authentication = CachedJWTAuthentication()
+        authentication.get_user(self.token)
+        invalidate_user(7)
+        self.assertEqual(user_cache.entries, {})
+        authentication.get_user(self.token)
+        self.assertEqual(len(self.loaded), 2)
@@ -0,0 +1,79 @@
+"""
+Lazy URL resolution for the addons declared in the manifest.
+
+``include()`` imports an addon URLconf as soon as ``erp.urls`` is loaded, so the startup time
+grows with every installed addon. The resolvers below keep the dotted path of the URLconf and
+only import it the first time a request path starts with ``apps/<addon>/``.
+
+Anything walking the whole URL tree still imports every addon URLconf: ``reverse()``, the
+technical 404 page shown when DEBUG is True and the system checks.
+"""
+
+from importlib import import_module
+import threading
+import time
+
+from django.urls import URLResolver
+from django.urls.resolvers import RoutePattern
+from django.utils.functional import cached_property
+
+from .manifest import get_addons
+
+
+# Addon name -> seconds spent importing its URLconf
+urlconf_timings = {}
+
+_import_lock = threading.Lock()
+
+
+class LazyAddonResolver(URLResolver):
+
+    def __init__(self, addon):
+        self.addon_name = addon['name']
+        super().__init__(
+            RoutePattern(f"apps/{self.addon_name}/"),
+            f"{self.addon_name}.urls",
+            app_name=addon.get('app_name'),
+            namespace=addon.get('namespace'),
+        )
+
+    # Like include(), the namespace defaults to the app_name of the URLconf module. The manifest
+    # may override both. Reading them imports the URLconf, which only reverse() does.
+
+    @property
+    def app_name(self):
+        if self._app_name is None:
+            return getattr(self.urlconf_module, 'app_name', None)
+        return self._app_name
+
+    @app_name.setter
+    def app_name(self, value):
+        self._app_name = value
+
+    @property
+    def namespace(self):
+        if self._namespace is None:
+            return self.app_name
+        return self._namespace
+
+    @namespace.setter
+    def namespace(self, value):
+        self._namespace = value
+
+    @cached_property
+    def urlconf_module(self):
+        with _import_lock:
+            if self.addon_name in urlconf_timings:
+                return import_module(self.urlconf_name)
+            start = time.perf_counter()
+            module = import_module(self.urlconf_name)
+            urlconf_timings[self.addon_name] = time.perf_counter() - start
+        print(f"Addon {self.addon_name} URLconf loaded in {urlconf_timings[self.addon_name] * 1000:.1f} ms.")
+        return module
+
+
+def addon_urlpatterns():
+    """
+    Build one lazy resolver per addon declared in the manifest.
+    """
+    return [LazyAddonResolver(addon) for addon in get_addons()]
@@ -3,6 +3,9 @@ ASGI config for erp project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The change feed (apps/graphql/changes/<model>) streams Server-Sent Events and must be
+served by this application (e.g. uvicorn erp.asgi:application), not by WSGI.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -14,3 +17,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'erp.settings')
 
 application = get_asgi_application()
+
+# Cancel the queries of the requests whose client went away
+from graphql.helpers.governor import CancelOnDisconnect
+
+application = CancelOnDisconnect(application)
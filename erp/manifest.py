@@ -0,0 +1,29 @@
+"""
+Addon manifest loading for the erp project.
+
+The manifest is parsed once per process and shared by the settings and the URL configuration.
+This module must not import django models or URL machinery, settings import it.
+"""
+
+from functools import lru_cache
+import json
+import os
+
+
+MANIFEST_PATH = os.environ.get("ERP_MANIFEST_PATH", "/configs/manifest.json")
+
+
+@lru_cache(maxsize=None)
+def load_manifest(path=MANIFEST_PATH):
+    """
+    Parse the manifest file once and return its content.
+    """
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def get_addons():
+    """
+    Return the list of addons declared in the manifest.
+    """
+    return load_manifest()['addons']
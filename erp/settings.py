@@ -14,18 +14,15 @@ from pathlib import Path
 import os
 import sys
 from datetime import timedelta
-import json
 
+from .manifest import get_addons
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # Loading Manifest
-manifest_file = open("/configs/manifest.json")
-manifest = json.load(manifest_file) 
-
-addons = manifest['addons']
+addons = get_addons()
 
 sys.path.append("/addons")
 
@@ -60,6 +57,7 @@ CSRF_TRUSTED_ORIGINS = [
 # Application definition
 INSTALLED_APPS = [
     'core',
+    'graphql',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -71,8 +69,8 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt'
 ]   
 
-for index, addon in enumerate(addons):
-    INSTALLED_APPS.append(f'{addon['name']}')  
+for addon in addons:
+    INSTALLED_APPS.append(addon['name'])
 
 
 MIDDLEWARE = [
@@ -128,10 +126,23 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedJWTAuthentication',
     ),
 }
 
+# Authenticated users cached per (user id, token id), see core.authentication.
+# Invalidations reach the other processes through the Django cache: configure a shared CACHES backend
+# (Redis, Memcached, database), otherwise a user deactivated in another process stays authenticated here
+# for up to AUTH_USER_CACHE_TTL seconds.
+AUTH_USER_CACHE_SIZE = 10000
+AUTH_USER_CACHE_TTL = 60
+
+# Searchable text columns per table for the search mode of the graphQL view,
+# indexed with: python manage.py search_indexes
+GRAPHQL_SEARCH_COLUMNS = {
+    'core_address': ['street', 'city', 'state', 'zipcode'],
+}
+
 APPEND_SLASH=False
 
 SIMPLE_JWT = {
@@ -0,0 +1,47 @@
+import importlib
+import sys
+from types import ModuleType
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.urls import path
+
+from .addon_urls import LazyAddonResolver, urlconf_timings
+
+
+def view(request):
+    pass
+
+
+class LazyAddonResolverTests(SimpleTestCase):
+
+    def setUp(self):
+        module = ModuleType('lazyaddon.urls')
+        module.app_name = 'lazy'
+        module.urlpatterns = [path('items/', view, name='items')]
+        patcher = mock.patch.dict(sys.modules, {'lazyaddon': ModuleType('lazyaddon'), 'lazyaddon.urls': module})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(urlconf_timings.pop, 'lazyaddon', None)
+
+    def test_urlconf_imported_on_first_resolve(self):
+        resolver = LazyAddonResolver({'name': 'lazyaddon'})
+        with mock.patch('erp.addon_urls.import_module', wraps=importlib.import_module) as import_module:
+            self.assertNotIn('urlconf_module', resolver.__dict__)
+            import_module.assert_not_called()
+            match = resolver.resolve('apps/lazyaddon/items/')
+            import_module.assert_called_once_with('lazyaddon.urls')
+        self.assertEqual(match.func, view)
+        self.assertIn('lazyaddon', urlconf_timings)
+
+    def test_namespace_defaults_to_the_module_app_name(self):
+        resolver = LazyAddonResolver({'name': 'lazyaddon'})
+        self.assertEqual(resolver.app_name, 'lazy')
+        self.assertEqual(resolver.namespace, 'lazy')
+        self.assertEqual(resolver.resolve('apps/lazyaddon/items/').view_name, 'lazy:items')
+
+    def test_manifest_overrides_the_namespace(self):
+        resolver = LazyAddonResolver({'name': 'lazyaddon', 'app_name': 'store', 'namespace': 'store-eu'})
+        self.assertEqual(resolver.app_name, 'store')
+        self.assertEqual(resolver.namespace, 'store-eu')
+        self.assertNotIn('urlconf_module', resolver.__dict__)
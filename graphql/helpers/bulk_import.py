@@ -0,0 +1,123 @@
+import codecs
+import csv
+import io
+import json
+
+
+def iter_text_lines(stream, encoding='utf-8'):
+    """
+    Decode a binary request stream line by line without reading the whole body in memory.
+
+    Parameters:
+    - stream: Any iterable of bytes lines (a Django HttpRequest, a file object, ...).
+    - encoding (str): Text encoding of the uploaded body.
+
+    Returns:
+    - iterator of str: Decoded lines, line endings included.
+    """
+    return codecs.iterdecode(stream, encoding)
+
+
+def iter_csv_rows(lines, columns=None, header=True):
+    """
+    Parse CSV lines into (line_number, values) tuples.
+
+    Parameters:
+    - lines (iterable of str): Decoded CSV lines.
+    - columns (list, optional): Target columns. When omitted the CSV header is used.
+    - header (bool): Whether the first record is a header line.
+
+    Returns:
+    - tuple: (columns, rows) where rows is an iterator of (line_number, values or error message).
+             Empty fields, quoted ("") or not, are loaded as NULL: csv.reader does not tell them
+             apart. Use NDJSON to load empty strings.
+    """
+    reader = csv.reader(lines)
+    if header:
+        header_row = next(reader, None)
+        if columns is None:
+            columns = header_row
+    if not columns:
+        raise ValueError("Unable to determine the columns to import")
+
+    def rows():
+        for values in reader:
+            if not values:
+                continue
+            if len(values) != len(columns):
+                yield reader.line_num, f"Expected {len(columns)} values, got {len(values)}"
+                continue
+            yield reader.line_num, [value if value != '' else None for value in values]
+
+    return columns, rows()
+
+
+def iter_ndjson_rows(lines, columns=None):
+    """
+    Parse NDJSON lines (one JSON object per line) into (line_number, values) tuples.
+
+    Parameters:
+    - lines (iterable of str): Decoded NDJSON lines.
+    - columns (list, optional): Target columns. When omitted the keys of the first object are used.
+
+    Returns:
+    - tuple: (columns, rows) where rows is an iterator of (line_number, values or error message).
+             Missing keys are loaded as NULL.
+    """
+    numbered = ((number, line) for number, line in enumerate(lines, start=1) if line.strip())
+    first = next(numbered, None)
+    pending = []
+    if first is not None:
+        pending.append(first)
+        if columns is None:
+            try:
+                columns = list(json.loads(first[1]).keys())
+            except (ValueError, AttributeError):
+                raise ValueError("The first NDJSON line must be a JSON object")
+    if not columns:
+        raise ValueError("Unable to determine the columns to import")
+
+    def rows():
+        for number, line in pending:
+            yield parse(number, line)
+        for number, line in numbered:
+            yield parse(number, line)
+
+    def parse(number, line):
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            return number, f"Invalid JSON: {error}"
+        if not isinstance(record, dict):
+            return number, "Expected a JSON object"
+        return number, [record.get(column) for column in columns]
+
+    return columns, rows()
+
+
+def to_copy_field(value):
+    """
+    Convert a python value to a field in COPY csv format.
+
+    None is written as an unquoted empty field (NULL) and every other value is quoted,
+    so empty strings are kept as empty strings.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        value = 'true' if value else 'false'
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def rows_to_csv(rows):
+    """
+    Serialize a list of value lists into an in-memory CSV buffer suitable for COPY ... FROM STDIN.
+    """
+    buffer = io.StringIO()
+    for values in rows:
+        buffer.write(','.join(to_copy_field(value) for value in values))
+        buffer.write('\n')
+    buffer.seek(0)
+    return buffer
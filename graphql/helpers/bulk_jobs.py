@@ -0,0 +1,344 @@
+import copy
+from contextlib import contextmanager
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import BulkJob
+from .db_graph_query import GraphQL
+
+
+JOB_CHUNK_SIZE = 1000
+
+# Seconds without heartbeat after which a running job is considered abandoned by a dead worker
+JOB_STALE_AFTER = 300
+
+MAX_REPORTED_ERRORS = 100
+
+
+class JobReclaimed(Exception):
+    """
+    Another worker reclaimed the job while this worker was processing a chunk.
+    """
+
+
+def job_items(operation, payload):
+    """
+    Return the list of items a job processes chunk by chunk.
+
+    Insert and upsert jobs are chunked on their rows ("values").
+    Update and delete jobs are chunked on their "batch" list, or hold a single statement.
+    Purge jobs hold a single condition, deleted in batches of rows.
+    """
+    if operation in ('insert', 'upsert'):
+        return payload['values']
+    return payload['batch'] if 'batch' in payload else [payload]
+
+
+def enqueue_job(operation, table_name, payload, owner=None):
+    """
+    Validate and persist a bulk write to be processed by the bulk_worker command.
+
+    Parameters:
+    - operation (str): One of insert, update, upsert, delete, purge.
+    - table_name (str): Target table.
+    - payload (dict): The body the synchronous helper would have received, without table_name.
+                      Examples:
+                        insert / upsert: {"columns": [...], "values": [[...], ...], "key": ["id"]}
+                        update: {"set_values": {...}, "condition": "...", "params": [...]} or {"batch": [{...}, ...]}
+                        delete: {"condition": "...", "params": [...]} or {"batch": [{...}, ...]}
+                        purge: {"condition": "...", "params": [...], "batch_size": 5000, "pause": 0.1}
+
+    Returns:
+    - BulkJob: The pending job.
+    """
+    if operation not in dict(BulkJob.OPERATIONS):
+        raise ValueError(f"Invalid operation: {operation}")
+    if not isinstance(payload, dict):
+        raise ValueError("The job payload must be a JSON object")
+
+    if operation in ('insert', 'upsert'):
+        if not isinstance(payload.get('columns'), list) or not isinstance(payload.get('values'), list):
+            raise ValueError(f"An {operation} job needs 'columns' and 'values' lists")
+    else:
+        required = ('set_values', 'condition') if operation == 'update' else ('condition',)
+        for item in job_items(operation, payload):
+            if not isinstance(item, dict) or any(field not in item for field in required):
+                raise ValueError(f"Every {operation} item needs {', '.join(required)}")
+
+    return BulkJob.objects.create(
+        operation=operation,
+        table_name=table_name,
+        payload=payload,
+        # The rows to purge are counted by the worker
+        total=0 if operation == 'purge' else len(job_items(operation, payload)),
+        owner=owner,
+    )
+
+
+def job_status(job):
+    """
+    Serialize a job for the status endpoint.
+    """
+    return {
+        "job_id": job.id,
+        "operation": job.operation,
+        "table_name": job.table_name,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.processed,
+        "progress": round(job.processed * 100 / job.total, 2) if job.total else 100.0,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def claim_job(worker, stale_after=JOB_STALE_AFTER):
+    """
+    Claim the oldest pending job, or a running job abandoned by a dead worker.
+
+    The row is locked with FOR UPDATE SKIP LOCKED, so concurrent workers never claim the same job
+    and never wait on each other.
+
+    Returns:
+    - BulkJob or None: The claimed job, now running for this worker.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            BulkJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='pending') | Q(status='running', heartbeat_at__lt=now - timedelta(seconds=stale_after)))
+            .order_by('id')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'running'
+        job.worker = worker
+        job.started_at = job.started_at or now
+        job.heartbeat_at = now
+        job.save(update_fields=['status', 'worker', 'started_at', 'heartbeat_at'])
+    return job
+
+
+def _save_job(job, **fields):
+    """
+    Save job fields only while this worker still owns the job.
+
+    Returns:
+    - bool: False when another worker reclaimed the job in the meantime.
+    """
+    for name, value in fields.items():
+        setattr(job, name, value)
+    return BulkJob.objects.filter(id=job.id, worker=job.worker).update(**fields) == 1
+
+
+def _record_error(result, item, error):
+    result['rows_failed'] += 1
+    if len(result['errors']) < MAX_REPORTED_ERRORS:
+        result['errors'].append({"item": item, "error": str(error).strip()})
+
+
+def _insert_chunk(gql, job, chunk, start, result):
+    """
+    Insert a chunk with one statement. When the statement is refused the rows are inserted
+    one by one, each in its own savepoint, so a bad row is recorded and skipped instead of
+    losing the rows after it.
+    """
+    columns = job.payload['columns']
+    rows = []
+    for offset, values in enumerate(chunk):
+        if not isinstance(values, list) or len(values) != len(columns):
+            _record_error(result, start + offset, f"Expected {len(columns)} values")
+        else:
+            rows.append((start + offset, values))
+
+    insert_data = {"table_name": job.table_name, "columns": columns}
+    try:
+        with transaction.atomic():
+            ids = gql.insert_rows(dict(insert_data, values=[values for _, values in rows]))
+        result['rows_affected'] += len(ids)
+        return
+    except DatabaseError:
+        pass
+
+    for item, values in rows:
+        try:
+            with transaction.atomic():
+                result['rows_affected'] += len(gql.insert_rows(dict(insert_data, values=[values])))
+        except DatabaseError as error:
+            _record_error(result, item, error)
+
+
+def _run_chunk(gql, job, chunk, start, result):
+    """
+    Apply one chunk of a job through the GraphQL helper and accumulate its outcome in result.
+    """
+    payload = job.payload
+    if job.operation == 'insert':
+        _insert_chunk(gql, job, chunk, start, result)
+    elif job.operation == 'upsert':
+        ids = gql.upsert_into_table({
+            "table_name": job.table_name,
+            "columns": payload['columns'],
+            "values": chunk,
+            "key": payload.get('key', ['id']),
+        })
+        result['rows_affected'] += len(ids)
+    else:
+        write = gql.update_rows if job.operation == 'update' else gql.delete_rows
+        for offset, item in enumerate(chunk):
+            # One savepoint per item, a failing item is recorded without losing the others
+            try:
+                with transaction.atomic():
+                    result['rows_affected'] += write(dict(item, table_name=job.table_name))
+            except (DatabaseError, ValueError) as error:
+                _record_error(result, start + offset, error)
+
+
+def _apply_chunk(gql, job, chunk, start, result):
+    """
+    Apply one chunk and save the progress of the job.
+
+    The chunk is written in the same transaction as the progress, so it is applied exactly once,
+    and rolled back when another worker reclaimed the job.
+
+    Returns:
+    - bool: False when another worker reclaimed the job in the meantime.
+    """
+    chunk_result = copy.deepcopy(result)
+    try:
+        with transaction.atomic():
+            _run_chunk(gql, job, chunk, start, chunk_result)
+            if not _save_job(job, processed=start + len(chunk), result=chunk_result, heartbeat_at=timezone.now()):
+                # Roll the chunk back, the other worker applies it
+                raise JobReclaimed()
+    except JobReclaimed:
+        return False
+    result.update(chunk_result)
+    return True
+
+
+@contextmanager
+def _heartbeat(job, interval):
+    """
+    Refresh the heartbeat of a job from a background thread while it is processed, so a chunk
+    running longer than stale_after does not get the job reclaimed by another worker.
+    """
+    stopped = threading.Event()
+
+    def beat():
+        try:
+            while not stopped.wait(interval):
+                BulkJob.objects.filter(id=job.id, worker=job.worker).update(heartbeat_at=timezone.now())
+        except Exception as error:
+            print(f"Error refreshing the heartbeat of job {job.id}: {error}")
+        finally:
+            # The connection of this thread
+            connection.close()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def _purge(gql, job, result):
+    """
+    Run a purge job through GraphQL.delete_in_batches, saving the progress after every batch.
+
+    Rows already deleted by a previous worker are gone, so a reclaimed purge simply resumes.
+
+    Returns:
+    - bool: False when another worker reclaimed the job in the meantime.
+    """
+    payload = dict(job.payload, table_name=job.table_name)
+    if not job.total:
+        # One count when the purge starts, to report a progress
+        count = gql.select_from_table(dict(payload, aggregate={"aggregates": [{"function": "count", "alias": "total"}]}))[0]
+        if count and not _save_job(job, total=job.processed + count[0]['total']):
+            return False
+
+    owned = True
+
+    def on_batch(deleted):
+        nonlocal owned
+        result['rows_affected'] += deleted
+        owned = _save_job(job, processed=job.processed + deleted, result=result, heartbeat_at=timezone.now())
+        return owned
+
+    gql.delete_in_batches(payload, on_batch)
+    if not owned:
+        print(f"Job {job.id} was reclaimed by another worker, stopping.")
+    return owned
+
+
+def process_job(job, chunk_size=JOB_CHUNK_SIZE, stale_after=JOB_STALE_AFTER):
+    """
+    Process a claimed job chunk by chunk, saving the progress after each chunk.
+
+    A job reclaimed after a worker died resumes after its last saved chunk. A chunk commits with
+    its progress, so it is applied exactly once (see _apply_chunk). Purge batches commit on their
+    own: the progress of a batch running when a worker dies is lost, but its rows are gone, so
+    the next worker only deletes what is left.
+
+    Rows and items refused by the database are recorded in result.errors and skipped, the job
+    then ends failed once every chunk has been applied.
+    """
+    gql = GraphQL()
+    items = job_items(job.operation, job.payload)
+    result = dict(job.result)
+    result.setdefault('rows_affected', 0)
+    result.setdefault('rows_failed', 0)
+    result.setdefault('errors', [])
+
+    try:
+        with _heartbeat(job, stale_after / 3):
+            if job.operation == 'purge':
+                if not _purge(gql, job, result):
+                    return job
+                items = []
+            for start in range(job.processed, len(items), chunk_size):
+                chunk = items[start:start + chunk_size]
+                if not _apply_chunk(gql, job, chunk, start, result):
+                    print(f"Job {job.id} was reclaimed by another worker, stopping.")
+                    return job
+        if result['rows_failed']:
+            status, error = 'failed', f"{result['rows_failed']} rows could not be written, see result.errors"
+        else:
+            status, error = 'done', ''
+    except Exception as e:
+        status, error = 'failed', str(e)
+        print(f"Job {job.id} failed: {error}")
+
+    _save_job(job, status=status, error=error, result=result, finished_at=timezone.now())
+    print(f"Job {job.id} {status}. {job.processed}/{job.total} items processed.")
+    return job
+
+
+def run_worker(chunk_size=JOB_CHUNK_SIZE, poll_interval=2.0, stale_after=JOB_STALE_AFTER, once=False):
+    """
+    Claim and process jobs until stopped, or until the queue is empty when once is True.
+    """
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"Bulk worker {worker} started.")
+    while True:
+        job = claim_job(worker, stale_after)
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        process_job(job, chunk_size, stale_after)
@@ -0,0 +1,138 @@
+import asyncio
+import json
+
+import psycopg2
+import psycopg2.extensions
+from django.conf import settings
+from django.db import connection, transaction
+
+
+CHANGE_CHANNEL = 'graphql_changes'
+
+# NOTIFY payloads must be shorter than 8000 bytes, an event over the limit is sent without its ids
+MAX_PAYLOAD_BYTES = 7999
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Queued in place of the events a slow subscriber lost, sent as an "overflow" event
+OVERFLOW = {"overflow": True}
+
+
+def notify_change(table_name, operation, count, ids=None):
+    """
+    Publish a row change event on the graphql_changes channel with pg_notify.
+
+    The notification is delivered to listeners when the current transaction commits,
+    so rolled back writes are never announced. Inside a transaction the pg_notify runs in a
+    savepoint, so a failed notification does not abort the write of the caller.
+
+    Parameters:
+    - table_name (str): The changed table.
+    - operation (str): insert, update, upsert, delete or copy.
+    - count (int): Number of rows affected.
+    - ids (list, optional): Ids of the affected rows when known.
+    """
+    if not count or not getattr(settings, 'GRAPHQL_CHANGE_FEED', True):
+        return
+    event = {"table": str(table_name).lower(), "op": operation, "count": count}
+    payload = json.dumps(dict(event, ids=ids), default=str) if ids is not None else None
+    if payload is None or len(payload.encode()) > MAX_PAYLOAD_BYTES:
+        payload = json.dumps(event)
+    try:
+        if connection.in_atomic_block:
+            with transaction.atomic(), connection.cursor() as cur:
+                cur.execute("SELECT pg_notify(%s, %s)", [CHANGE_CHANNEL, payload])
+        else:
+            with connection.cursor() as cur:
+                cur.execute("SELECT pg_notify(%s, %s)", [CHANGE_CHANNEL, payload])
+    except Exception as error:
+        print(f"Error notifying change: {error}")
+
+
+class ChangeListener():
+    """
+    One LISTEN connection per process, fanning the change events out to in-memory subscriber queues.
+
+    The connection is registered on the event loop with add_reader, so idle subscribers cost
+    nothing but their queue: no thread, no polling and no database connection each.
+    """
+
+    def __init__(self):
+        self.subscribers = {}
+        self.conn = None
+        self.loop = None
+
+    def subscribe(self, table_name):
+        """
+        Register a subscriber for a table ("*" for every table) and return its queue.
+        Must be called from the event loop.
+        """
+        self._ensure_listening()
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.setdefault(table_name, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, table_name, queue):
+        queues = self.subscribers.get(table_name)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[table_name]
+
+    def _ensure_listening(self):
+        loop = asyncio.get_running_loop()
+        if self.conn is not None and self.loop is loop:
+            return
+        self._stop()
+        self.loop = loop
+        self.conn = psycopg2.connect(**connection.get_connection_params())
+        self.conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with self.conn.cursor() as cur:
+            cur.execute(f"LISTEN {CHANGE_CHANNEL}")
+        loop.add_reader(self.conn.fileno(), self._on_readable)
+
+    def _stop(self):
+        if self.conn is None:
+            return
+        try:
+            self.loop.remove_reader(self.conn.fileno())
+            self.conn.close()
+        except Exception:
+            pass
+        self.conn = None
+
+    def _restart(self):
+        try:
+            if self.subscribers:
+                self._ensure_listening()
+        except psycopg2.Error as error:
+            print(f"Error restarting the change listener: {error}")
+            self.loop.call_later(5, self._restart)
+
+    def _on_readable(self):
+        try:
+            self.conn.poll()
+        except psycopg2.Error as error:
+            print(f"Change listener connection lost: {error}")
+            self._stop()
+            self.loop.call_later(1, self._restart)
+            return
+
+        while self.conn.notifies:
+            notification = self.conn.notifies.pop(0)
+            try:
+                event = json.loads(notification.payload)
+            except ValueError:
+                continue
+            queues = self.subscribers.get(event.get('table'), set()) | self.subscribers.get('*', set())
+            for queue in queues:
+                if queue.full():
+                    # A slow subscriber does not grow without bound: its pending events are dropped
+                    # and replaced by an overflow marker telling the client to resync the table
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(OVERFLOW)
+                queue.put_nowait(event)
+
+
+change_listener = ChangeListener()
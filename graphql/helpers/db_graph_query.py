@@ -1,6 +1,155 @@
 import psycopg2
+import base64
 import json
-from django.db import connection
+import re
+import time
+import uuid
+from django.conf import settings
+from django.db import connection, transaction
+from .bulk_import import rows_to_csv
+from .query_stats import record_select
+from .change_feed import notify_change
+from ..models import SyncTable
+
+
+IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_$]*$')
+
+MERGE_MODES = ('insert', 'upsert', 'replace')
+
+MAX_REPORTED_REJECTS = 100
+
+AGGREGATE_FUNCTIONS = {
+    'count': 'COUNT({})',
+    'count_distinct': 'COUNT(DISTINCT {})',
+    'sum': 'SUM({})',
+    'avg': 'AVG({})',
+    'min': 'MIN({})',
+    'max': 'MAX({})',
+}
+
+COMPARISON_OPERATORS = ('=', '<>', '!=', '<', '<=', '>', '>=')
+
+# Lists of the aggregate specification and the type of their entries
+AGGREGATE_SPEC_LISTS = (
+    ('group_by', str, 'column names'),
+    ('aggregates', dict, 'objects'),
+    ('having', dict, 'objects'),
+    ('order_by', str, 'column names'),
+)
+
+# Changes after a (xid, row_id) position and below the horizon, in keyset order. The last change
+# of a row within one transaction wins. Served by graphql_changelog_key_idx, a page costs its size.
+CHANGES_QUERY = """
+SELECT DISTINCT ON (xid, row_id) xid, row_id, op
+FROM graphql_changelog
+WHERE table_name = %s AND (xid, row_id) > (%s, %s) AND xid < %s
+ORDER BY xid, row_id, id DESC
+LIMIT %s
+"""
+
+MAX_ROW_ID = 2 ** 63 - 1
+
+QUERY_CANCELED = '57014'
+
+
+SEARCH_MODES = ('prefix', 'contains')
+
+MAX_SEARCH_PAGE_SIZE = 100
+
+
+def search_columns(table_name):
+    """
+    Return the searchable columns of a table, configured in settings.GRAPHQL_SEARCH_COLUMNS.
+
+    Raises:
+    - ValueError: If search is not enabled on the table.
+    """
+    relname = str(table_name).split('.')[-1].lower()
+    columns = getattr(settings, 'GRAPHQL_SEARCH_COLUMNS', {}).get(relname)
+    if not columns:
+        raise ValueError(f"Search is not enabled on {relname}")
+    return [quote_identifier(column) for column in columns]
+
+
+def search_config():
+    config = getattr(settings, 'GRAPHQL_SEARCH_CONFIG', 'simple')
+    if not IDENTIFIER_RE.match(config):
+        raise ValueError(f"Invalid text search configuration: {config}")
+    return config
+
+
+def search_document(columns):
+    """
+    The tsvector expression of the searchable columns.
+
+    The full-text GIN index is built on this exact expression (see the search_indexes command),
+    so the planner can use it for the @@ match.
+    """
+    concatenated = " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+    return f"to_tsvector('{search_config()}'::regconfig, {concatenated})"
+
+
+def is_query_canceled(error):
+    """
+    Whether a database error comes from a statement_timeout or a cancel request (SQLSTATE 57014).
+
+    Django re-raises the psycopg2 errors with the original one as __cause__.
+    """
+    return QUERY_CANCELED in (getattr(error, 'pgcode', None), getattr(error.__cause__, 'pgcode', None))
+
+
+class SyncTokenExpired(ValueError):
+    """
+    The sync token is older than the tombstones still kept, the client must sync the whole table again.
+    """
+
+
+def parse_sync_token(token):
+    """
+    Parse a sync token into its (xid, row_id) position.
+
+    A token is either a transaction horizon "<xid>", every change below it being synced, or
+    "<xid>:<row_id>" when a page ended inside the changes of transaction xid.
+
+    Raises:
+    - ValueError: If the token is malformed.
+    """
+    xid, _, row_id = str(token).partition(':')
+    try:
+        return int(xid), int(row_id) if row_id else None
+    except ValueError:
+        raise ValueError(f"Invalid sync token: {token}")
+
+
+def quote_identifier(name):
+    """
+    Validate a table or column name (optionally schema qualified) and return it double quoted.
+
+    Names are folded to lower case, exactly like PostgreSQL does for unquoted identifiers,
+    so quoting only protects against injection and reserved words.
+
+    Raises:
+    - ValueError: If the name is not a plain SQL identifier.
+    """
+    parts = str(name).split('.')
+    if len(parts) > 2 or not all(IDENTIFIER_RE.match(part) for part in parts):
+        raise ValueError(f"Invalid identifier: {name}")
+    return '.'.join(f'"{part.lower()}"' for part in parts)
+
+
+def order_by_clause(order_by):
+    """
+    Build an ORDER BY list from column names, a leading "-" meaning descending.
+
+    Raises:
+    - ValueError: If order_by is not a list of column names.
+    """
+    if not isinstance(order_by, list) or not all(isinstance(column, str) for column in order_by):
+        raise ValueError("order_by must be a list of column names")
+    return ', '.join(
+        f"{quote_identifier(column[1:])} DESC" if column.startswith('-') else quote_identifier(column)
+        for column in order_by
+    )
 
 
 class GraphQL():
@@ -45,8 +194,12 @@ class GraphQL():
             # Commit the transaction
             conn.commit()
             print(f"Update successful. {rows_affected} rows affected.")
+            notify_change(update_data['table_name'], 'update', rows_affected)
             
         except (Exception, psycopg2.DatabaseError) as error:
+            if is_query_canceled(error):
+                # Stopped by its statement_timeout or a cancel, the governor answers 504/503
+                raise
             print(f"Error updating data: {error}")
             rows_affected = 0  # Reset rows_affected if there's an error
         
@@ -118,8 +271,12 @@ class GraphQL():
             conn.commit()
             print(ids)
             print("Insertion successful.") 
+            notify_change(insert_data['table_name'], 'insert', len(ids), ids)
             
         except (Exception, psycopg2.DatabaseError) as error:
+            if is_query_canceled(error):
+                # Stopped by its statement_timeout or a cancel, the governor answers 504/503
+                raise
             ids.append(f"Error inserting data: {error}")
             print(f"Error inserting data: {error}")
         
@@ -155,6 +312,128 @@ class GraphQL():
 
 
 
+    def upsert_into_table(self, upsert_data):
+        """
+        Insert or update rows dynamically in a PostgreSQL table based on provided JSON data.
+
+        Parameters:
+        - upsert_data (dict): JSON data containing table name, columns, values and the conflict key.
+                            Should have keys: table_name, columns, values, key (optional, defaults to ["id"]).
+                            Example: {
+                                "table_name": "my_table",
+                                "columns": ["id", "column1", ...],
+                                "values": [[1, "value1", ...], [2, "value1", ...], ...],
+                                "key": ["id"]
+                            }
+                            Rows whose key already exists are updated with the other columns.
+
+        Returns:
+        - list: Ids of the inserted or updated rows.
+        """
+        if not upsert_data['values']:
+            return []
+
+        table_name = quote_identifier(upsert_data['table_name'])
+        columns = [quote_identifier(column) for column in upsert_data['columns']]
+        key = [quote_identifier(column) for column in upsert_data.get('key', ['id'])]
+        if not set(key) <= set(columns):
+            raise ValueError("Upsert key columns must be part of the columns")
+
+        # ON CONFLICT cannot update the same row twice in one statement, the last row of a key wins
+        key_positions = [columns.index(column) for column in key]
+        rows = {tuple(values[position] for position in key_positions): values for values in upsert_data['values']}
+
+        # One multi-row statement per call instead of one round trip per row
+        row_template = '(' + ', '.join(['%s'] * len(columns)) + ')'
+        values_template = ', '.join([row_template] * len(rows))
+        updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in columns if column not in key)
+        action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        upsert_query = (
+            f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES {values_template} "
+            f"ON CONFLICT ({', '.join(key)}) {action} RETURNING id"
+        )
+
+        cur = connection.cursor()
+        try:
+            cur.execute(upsert_query, [value for values in rows.values() for value in values])
+            ids = [row[0] for row in cur.fetchall()]
+            print(f"Upsert successful. {len(ids)} rows affected.")
+            notify_change(upsert_data['table_name'], 'upsert', len(ids), ids)
+        finally:
+            cur.close()
+        return ids
+
+    def insert_rows(self, insert_data):
+        """
+        Insert rows with one multi-row statement. Unlike insert_into_table, it neither commits,
+        nor closes the connection, nor catches the errors: the caller owns the transaction.
+
+        Parameters:
+        - insert_data (dict): JSON data containing table name, columns, and values to insert.
+                            Should have keys: table_name, columns, values, like insert_into_table.
+
+        Returns:
+        - list: Ids of the inserted rows.
+        """
+        if not insert_data['values']:
+            return []
+
+        table_name = quote_identifier(insert_data['table_name'])
+        columns = [quote_identifier(column) for column in insert_data['columns']]
+        row_template = '(' + ', '.join(['%s'] * len(columns)) + ')'
+        values_template = ', '.join([row_template] * len(insert_data['values']))
+        insert_query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES {values_template} RETURNING id"
+
+        cur = connection.cursor()
+        try:
+            cur.execute(insert_query, [value for values in insert_data['values'] for value in values])
+            ids = [row[0] for row in cur.fetchall()]
+            notify_change(insert_data['table_name'], 'insert', len(ids), ids)
+        finally:
+            cur.close()
+        return ids
+
+    def update_rows(self, update_data):
+        """
+        Update rows matching a condition. Like insert_rows, it neither commits, nor closes the
+        connection, nor catches the errors.
+
+        Parameters:
+        - update_data (dict): JSON data containing table name, set values, condition and optional params.
+                            Should have keys: table_name, set_values, condition, params (optional).
+                            'params' are bound after the set values, to the placeholders of 'condition'.
+
+        Returns:
+        - int: Number of rows updated.
+        """
+        table_name = quote_identifier(update_data['table_name'])
+        set_values = ', '.join(f"{quote_identifier(column)} = %s" for column in update_data['set_values'])
+        params = list(update_data['set_values'].values()) + list(update_data.get('params', []))
+        with connection.cursor() as cur:
+            cur.execute(f"UPDATE {table_name} SET {set_values} WHERE {update_data['condition']}", params)
+            rows_affected = cur.rowcount
+        notify_change(update_data['table_name'], 'update', rows_affected)
+        return rows_affected
+
+    def delete_rows(self, delete_data):
+        """
+        Delete rows matching a condition. Like insert_rows, it neither commits, nor closes the
+        connection, nor catches the errors.
+
+        Parameters:
+        - delete_data (dict): JSON data containing table name, condition and optional params,
+                            like delete_from_table.
+
+        Returns:
+        - int: Number of rows deleted.
+        """
+        table_name = quote_identifier(delete_data['table_name'])
+        with connection.cursor() as cur:
+            cur.execute(f"DELETE FROM {table_name} WHERE {delete_data['condition']}", delete_data.get('params'))
+            rows_deleted = cur.rowcount
+        notify_change(delete_data['table_name'], 'delete', rows_deleted)
+        return rows_deleted
+
     def select_from_table(self, select_data):
         """
         Select data dynamically from a PostgreSQL table based on provided JSON data and return results in JSON format.
@@ -163,60 +442,93 @@ class GraphQL():
         - connection_params (dict): Dictionary containing PostgreSQL connection parameters.
                                 Should include keys: host, port, database, user, password.
         - select_data (dict): JSON data containing table name, columns, condition, and optional parameters for selection.
-                            Should have keys: table_name, columns, condition, params (optional).
+                            Should have keys: table_name, columns, condition, params (optional), order_by (optional).
                             Example: {
                                 "table_name": "my_table",
                                 "columns": ["column1", "column2", ...],
                                 "condition": "column1 = %s",
-                                "params": ["value1"]
+                                "params": ["value1"],
+                                "order_by": ["column2", "-column3"]
                             }
                             'condition' is a string representing the WHERE clause condition.
                             'params' is a list of parameters for the condition placeholders.
+                            'order_by' is a list of columns, prefixed with "-" for a descending order.
+                            'aggregate' (optional) groups the rows in PostgreSQL and returns one row per group:
+                            {
+                                "group_by": ["city"],
+                                "aggregates": [
+                                    {"function": "count", "column": "*", "alias": "total"},
+                                    {"function": "max", "column": "zipcode"}
+                                ],
+                                "having": [{"aggregate": "total", "operator": ">=", "value": 10}],
+                                "order_by": ["-total", "city"]
+                            }
+                            Functions: count, count_distinct, sum, avg, min, max. The alias defaults to
+                            "<function>_<column>". 'condition' still filters the rows before grouping.
                             
         Returns:
         - str: JSON string representing selected rows from the table.
+
+        Raises:
+        - ValueError: If the aggregate specification or order_by is invalid.
+        - django.db.OperationalError: If the query is stopped by its statement_timeout or cancelled,
+                                      other database errors return no rows.
         """
         selected_rows = []
+        results = []
+        total_rows = None
+        total_pages = None
+        started = time.perf_counter()
         page_size = select_data.get('page_size', 10)
         page_number = select_data.get('page_number', 1)
         offset = (page_number - 1) * page_size
+
+        aggregate_query = aggregate_params = None
+        if 'aggregate' in select_data:
+            aggregate_query, aggregate_params = self._aggregate_query(select_data)
+        # Validated before the query runs, like the aggregate specification
+        order_by = order_by_clause(select_data['order_by']) if select_data.get('order_by') else None
         
         try:
             # Establish connection to PostgreSQL
             conn = connection
             cur = conn.cursor()
 
-            total_rows = None
-            total_pages = None
+            params = select_data.get('params')
 
-            if 'page_size' in select_data and 'page_number' in select_data:
-                # Construct the count query to get the total number of rows
+            if aggregate_query is not None:
+                # Groups and aggregates are computed by PostgreSQL, only the groups are returned
+                select_query = aggregate_query
+                params = aggregate_params
+                count_query = f"SELECT COUNT(*) FROM ({aggregate_query}) AS aggregate_groups"
+            else:
+                # Construct the SQL query dynamically
+                columns = ', '.join(select_data['columns']) if 'columns' in select_data else '*'
+                select_query = f"SELECT {columns} FROM {select_data['table_name']}"
                 count_query = f"SELECT COUNT(*) FROM {select_data['table_name']}"
                 if 'condition' in select_data:
+                    select_query += f" WHERE {select_data['condition']}"
                     count_query += f" WHERE {select_data['condition']}"
 
-                # Execute the count query
-                if 'params' in select_data:
-                    cur.execute(count_query, select_data['params'])
+                if order_by:
+                    select_query += f" ORDER BY {order_by}"
+
+            if 'page_size' in select_data and 'page_number' in select_data:
+                # Execute the count query to get the total number of rows
+                if params is not None:
+                    cur.execute(count_query, params)
                 else:
                     cur.execute(count_query)
 
                 # Fetch the total number of rows
                 total_rows = cur.fetchone()[0]
                 total_pages = (total_rows + page_size - 1) // page_size  # Calculate total pages
-            
-            # Construct the SQL query dynamically
-            columns = ', '.join(select_data['columns']) if 'columns' in select_data else '*'
-            select_query = f"SELECT {columns} FROM {select_data['table_name']}"
-            if 'condition' in select_data:
-                select_query += f" WHERE {select_data['condition']}"
 
-            if 'page_size' in select_data and 'page_number' in select_data:
                 select_query += f" LIMIT {page_size} OFFSET {offset}"
 
             # Execute the select operation
-            if 'params' in select_data:
-                cur.execute(select_query, select_data['params'])
+            if params is not None:
+                cur.execute(select_query, params)
             else:
                 cur.execute(select_query)
             
@@ -232,8 +544,25 @@ class GraphQL():
             json_output = json.dumps(results, default=str)  # Convert to JSON string
             
             print(f"Selection successful. {len(selected_rows)} rows selected.")
+
+            record_select(
+                select_data['table_name'],
+                select_data.get('condition'),
+                select_data.get('order_by'),
+                time.perf_counter() - started
+            )
             
         except (Exception, psycopg2.DatabaseError) as error:
+            if is_query_canceled(error):
+                # Timed out or cancelled: the caller answers 503/504, and the slowest predicates
+                # are exactly the ones the index advisor needs to see
+                record_select(
+                    select_data['table_name'],
+                    select_data.get('condition'),
+                    select_data.get('order_by'),
+                    time.perf_counter() - started
+                )
+                raise
             print(f"Error selecting data: {error}")
             json_output = "[]"  # Return empty JSON array if there's an error
         
@@ -272,6 +601,233 @@ class GraphQL():
     #     print(json_results)
 
 
+    def search_table(self, search_data):
+        """
+        Search a table on its searchable columns, ranked, with keyset paging.
+
+        Parameters:
+        - search_data (dict): JSON data containing table name, search terms and paging options.
+                            Should have keys: table_name, search, mode (optional), columns (optional),
+                            condition and params (optional), page_size (optional), cursor (optional).
+                            Example: {
+                                "table_name": "core_address",
+                                "search": "main str",
+                                "mode": "prefix",
+                                "columns": ["id", "street", "city"],
+                                "page_size": 20,
+                                "cursor": null
+                            }
+                            'mode' is "prefix" (full-text, every word used as a prefix, for type-ahead)
+                            or "contains" (trigram match anywhere in a column, ranked by similarity).
+                            'cursor' is the next_cursor of the previous page.
+
+        Returns:
+        - tuple: (rows, next_cursor). next_cursor is None on the last page.
+
+        Raises:
+        - ValueError: If search is not enabled on the table or the parameters are invalid.
+        """
+        table_name = quote_identifier(search_data['table_name'])
+        columns = search_columns(search_data['table_name'])
+        selected = ', '.join(quote_identifier(column) for column in search_data['columns']) if 'columns' in search_data else '*'
+        term = str(search_data.get('search', '')).strip()
+        mode = search_data.get('mode', 'prefix')
+        page_size = min(max(int(search_data.get('page_size', 20)), 1), MAX_SEARCH_PAGE_SIZE)
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Invalid search mode: {mode}. Expected one of {', '.join(SEARCH_MODES)}")
+
+        if mode == 'prefix':
+            words = re.findall(r'\w+', term)
+            if not words:
+                return [], None
+            query = ' & '.join(f"{word}:*" for word in words)
+            tsquery = f"to_tsquery('{search_config()}'::regconfig, %s)"
+            rank, rank_params = f"ts_rank({search_document(columns)}, {tsquery})", [query]
+            match, match_params = f"{search_document(columns)} @@ {tsquery}", [query]
+        else:
+            if not term:
+                return [], None
+            pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            rank = f"GREATEST({', '.join(f'similarity({column}, %s)' for column in columns)})"
+            rank_params = [term] * len(columns)
+            match = ' OR '.join(f"{column} ILIKE %s" for column in columns)
+            match_params = [pattern] * len(columns)
+
+        search_query = f"SELECT {selected}, {rank} AS search_rank FROM {table_name} WHERE ({match})"
+        params = rank_params + match_params
+        if 'condition' in search_data:
+            search_query += f" AND ({search_data['condition']})"
+            params += list(search_data.get('params', []))
+
+        if search_data.get('cursor'):
+            try:
+                last_rank, last_id = json.loads(base64.urlsafe_b64decode(search_data['cursor']))
+            except Exception:
+                raise ValueError("Invalid search cursor")
+            # Keyset paging on (rank DESC, id): stable and as fast for the last page as for the first
+            search_query += f" AND ({rank} < %s::real OR ({rank} = %s::real AND id > %s))"
+            params += rank_params + [last_rank] + rank_params + [last_rank, last_id]
+
+        search_query += f" ORDER BY search_rank DESC, id LIMIT {page_size + 1}"
+
+        with connection.cursor() as cur:
+            cur.execute(search_query, params)
+            names = [desc[0] for desc in cur.description]
+            rows = [dict(zip(names, row)) for row in cur.fetchall()]
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            if 'id' not in last:
+                raise ValueError("The selected columns must include id to page the results")
+            next_cursor = base64.urlsafe_b64encode(json.dumps([last['search_rank'], last['id']]).encode()).decode()
+
+        print(f"Search successful. {len(rows)} rows found.")
+        return rows, next_cursor
+
+    def select_changes_since(self, sync_data):
+        """
+        Select the rows inserted or updated, and the ids of the rows deleted, since a sync token.
+
+        Parameters:
+        - sync_data (dict): JSON data containing table name, sync token and optional columns and limit.
+                            Should have keys: table_name, since, columns (optional), limit (optional).
+                            Example: {
+                                "table_name": "my_table",
+                                "since": 0,
+                                "columns": ["id", "column1", ...],
+                                "limit": 1000
+                            }
+                            'since' is the token returned by the previous call, 0 for a first full sync.
+                            The table must have been enabled with the sync_changelog command.
+                            'limit' caps the number of changes returned, a page may end in the
+                            middle of the changes of one transaction.
+
+        Returns:
+        - tuple: (rows, deleted_ids, sync_token, has_more). When has_more is True the client
+                 calls again with the new token right away. The token is opaque, see parse_sync_token.
+
+        Raises:
+        - SyncTokenExpired: If the tombstones newer than the token have been pruned.
+        - ValueError: If the table is not enabled for sync or the parameters are invalid.
+        """
+        table_name = quote_identifier(sync_data['table_name'])
+        relname = table_name.split('.')[-1].strip('"')
+        columns = ', '.join(quote_identifier(column) for column in sync_data['columns']) if 'columns' in sync_data else '*'
+        since, after_row = parse_sync_token(sync_data['since'])
+        limit = max(int(sync_data.get('limit', 1000)), 1)
+
+        sync_table = SyncTable.objects.filter(table_name=relname).first()
+        if sync_table is None:
+            raise ValueError(f"Incremental sync is not enabled on {relname}")
+        if since and since < sync_table.pruned_before:
+            raise SyncTokenExpired("The sync token has expired, sync the whole table again with since=0")
+        if after_row is None:
+            # A horizon: every change of transaction since onwards
+            since, after_row = since - 1, MAX_ROW_ID
+
+        with connection.cursor() as cur:
+            # Every transaction below the horizon is finished: changes committed later are all above it
+            cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+            sync_token = cur.fetchone()[0]
+
+            cur.execute(CHANGES_QUERY, [relname, since, after_row, sync_token, limit + 1])
+            changes = cur.fetchall()
+            has_more = len(changes) > limit
+            if has_more:
+                # The next page starts right after the last change of this one, even inside a transaction
+                changes = changes[:limit]
+                sync_token = f"{changes[-1][0]}:{changes[-1][1]}"
+
+            # A row changed by several transactions of the page: its last change wins
+            last_ops = {row_id: op for _, row_id, op in changes}
+            changed_ids = [row_id for row_id, op in last_ops.items() if op != 'D']
+            deleted_ids = [row_id for row_id, op in last_ops.items() if op == 'D']
+
+            rows = []
+            if changed_ids:
+                cur.execute(f"SELECT {columns} FROM {table_name} WHERE id = ANY(%s)", [changed_ids])
+                names = [desc[0] for desc in cur.description]
+                rows = [dict(zip(names, row)) for row in cur.fetchall()]
+
+        print(f"Sync successful. {len(rows)} rows changed, {len(deleted_ids)} rows deleted.")
+        return rows, deleted_ids, sync_token, has_more
+
+    def _aggregate_query(self, select_data):
+        """
+        Build the GROUP BY query described by select_data['aggregate'].
+
+        Every identifier is validated and quoted, functions and operators come from a whitelist and
+        HAVING values are passed as parameters.
+
+        Returns:
+        - tuple: (query, params)
+        """
+        spec = select_data['aggregate']
+        if not isinstance(spec, dict):
+            raise ValueError("The aggregate specification must be a JSON object")
+        for name, item_type, description in AGGREGATE_SPEC_LISTS:
+            items = spec.get(name, [])
+            if not isinstance(items, list) or not all(isinstance(item, item_type) for item in items):
+                raise ValueError(f"aggregate.{name} must be a list of {description}")
+
+        group_by = [column.lower() for column in spec.get('group_by', [])]
+        select_list = [quote_identifier(column) for column in group_by]
+        expressions = {}
+        for aggregate in spec.get('aggregates', []):
+            function = str(aggregate.get('function', '')).lower()
+            if function not in AGGREGATE_FUNCTIONS:
+                raise ValueError(f"Invalid aggregate function: {function}")
+            column = aggregate.get('column', '*')
+            if column == '*':
+                if function != 'count':
+                    raise ValueError(f"{function} needs a column")
+                argument = '*'
+            else:
+                argument = quote_identifier(column)
+            alias = str(aggregate.get('alias') or f"{function}_{'all' if column == '*' else column}").lower()
+            if not IDENTIFIER_RE.match(alias) or alias in expressions or alias in group_by:
+                raise ValueError(f"Invalid or duplicated aggregate alias: {alias}")
+            expressions[alias] = AGGREGATE_FUNCTIONS[function].format(argument)
+            select_list.append(f"{expressions[alias]} AS {quote_identifier(alias)}")
+
+        if not select_list:
+            raise ValueError("The aggregate specification needs group_by columns or aggregates")
+
+        query = f"SELECT {', '.join(select_list)} FROM {quote_identifier(select_data['table_name'])}"
+        params = list(select_data.get('params', []))
+        if 'condition' in select_data:
+            query += f" WHERE {select_data['condition']}"
+        if group_by:
+            query += f" GROUP BY {', '.join(quote_identifier(column) for column in group_by)}"
+
+        having = []
+        for clause in spec.get('having', []):
+            alias = str(clause.get('aggregate', '')).lower()
+            operator = clause.get('operator', '=')
+            if alias not in expressions:
+                raise ValueError(f"Unknown aggregate in having: {alias}")
+            if operator not in COMPARISON_OPERATORS:
+                raise ValueError(f"Invalid having operator: {operator}")
+            if isinstance(clause.get('value'), (dict, list)):
+                raise ValueError(f"The having value of {alias} must be a number, a string or null")
+            having.append(f"{expressions[alias]} {operator} %s")
+            params.append(clause.get('value'))
+        if having:
+            query += f" HAVING {' AND '.join(having)}"
+
+        order_by = spec.get('order_by') or select_data.get('order_by') or []
+        if not isinstance(order_by, list) or not all(isinstance(column, str) for column in order_by):
+            raise ValueError("order_by must be a list of column names")
+        for column in order_by:
+            if column.lstrip('-').lower() not in group_by and column.lstrip('-').lower() not in expressions:
+                raise ValueError(f"Can only order by group_by columns or aggregates: {column}")
+        if order_by:
+            query += f" ORDER BY {order_by_clause(order_by)}"
+
+        return query, params if params else None
+
     def delete_from_table(self, delete_data):
         """
         Delete data dynamically from a PostgreSQL table based on provided JSON data.
@@ -314,8 +870,12 @@ class GraphQL():
             # Commit the transaction
             conn.commit()
             print(f"Deletion successful. {rows_deleted} rows deleted.")
+            notify_change(delete_data['table_name'], 'delete', rows_deleted)
             
         except (Exception, psycopg2.DatabaseError) as error:
+            if is_query_canceled(error):
+                # Stopped by its statement_timeout or a cancel, the governor answers 504/503
+                raise
             print(f"Error deleting data: {error}")
             rows_deleted = 0  # Reset rows_deleted if there's an error
         
@@ -348,4 +908,237 @@ class GraphQL():
     #     rows_deleted = delete_from_table(json_data)
         
     #     # Print the number of rows deleted
-    #     print("Rows deleted:", rows_deleted)
\ No newline at end of file
+    #     print("Rows deleted:", rows_deleted)
+
+    def delete_in_batches(self, delete_data, on_batch=None):
+        """
+        Delete rows matching a condition in bounded batches, committing after each batch.
+
+        Each batch locks at most batch_size rows for a short transaction, so large purges do not
+        hold locks or a huge transaction for minutes and do not stall concurrent traffic.
+
+        Parameters:
+        - delete_data (dict): JSON data containing table name, condition and batching options.
+                            Should have keys: table_name, condition, params (optional),
+                            batch_size (optional, default 5000), pause (optional, seconds slept between batches).
+                            Example: {
+                                "table_name": "my_table",
+                                "condition": "created_at < %s",
+                                "params": ["2020-01-01"],
+                                "batch_size": 5000,
+                                "pause": 0.1
+                            }
+        - on_batch (callable, optional): Called with the number of rows deleted by each batch.
+                            Returning False stops the purge after the current batch.
+
+        Returns:
+        - int: Number of rows deleted.
+        """
+        table_name = quote_identifier(delete_data['table_name'])
+        if not delete_data.get('condition'):
+            raise ValueError("A batched delete needs a condition, use \"TRUE\" to empty the table")
+        batch_size = max(int(delete_data.get('batch_size', 5000)), 1)
+        pause = float(delete_data.get('pause', 0))
+        params = delete_data.get('params')
+
+        # ctid = ANY(ARRAY(...)) is executed as a TID scan on the rows found by the subquery
+        delete_query = (
+            f"DELETE FROM {table_name} WHERE ctid = ANY(ARRAY("
+            f"SELECT ctid FROM {table_name} WHERE {delete_data['condition']} LIMIT {batch_size}"
+            f"))"
+        )
+
+        rows_deleted = 0
+        with connection.cursor() as cur:
+            while True:
+                with transaction.atomic():
+                    if params is not None:
+                        cur.execute(delete_query, params)
+                    else:
+                        cur.execute(delete_query)
+                    deleted = cur.rowcount
+                    notify_change(delete_data['table_name'], 'delete', deleted)
+                rows_deleted += deleted
+                if on_batch is not None and on_batch(deleted) is False:
+                    break
+                # A short batch does not mean the end: a matching row updated meanwhile moved to a
+                # new ctid and was skipped by the recheck, so only an empty batch ends the purge
+                if not deleted:
+                    break
+                if pause:
+                    time.sleep(pause)
+
+        print(f"Batched deletion successful. {rows_deleted} rows deleted.")
+        return rows_deleted
+
+
+    def copy_into_table(self, copy_data):
+        """
+        Bulk load rows into a PostgreSQL table with COPY ... FROM STDIN, chunk by chunk.
+
+        Parameters:
+        - copy_data (dict): JSON data containing table name, columns and the rows to load.
+                            Should have keys: table_name, columns, rows.
+                            Optional keys: chunk_size, mode, key.
+                            Example: {
+                                "table_name": "my_table",
+                                "columns": ["column1", "column2", ...],
+                                "rows": iterator of (line_number, ["value1", "value2", ...]),
+                                "chunk_size": 10000,
+                                "mode": "upsert",
+                                "key": ["id"]
+                            }
+                            'rows' yields (line_number, values); values may be an error message
+                            string for lines the parser already rejected.
+                            Without 'mode' the rows are copied straight into the table.
+                            With 'mode' the rows are first copied into a temporary staging table
+                            and then merged in a single transaction. The staging table has the NOT NULL
+                            and CHECK constraints of the target table, so only unique or foreign key
+                            violations can still make the merge fail:
+                              - insert: insert the staged rows, skipping rows conflicting with existing ones.
+                              - upsert: insert the staged rows, updating existing rows matching 'key'.
+                              - replace: delete every row of the table, then insert the staged rows.
+
+        Returns:
+        - dict: Import report with rows_loaded, rows_rejected, rows_skipped and the
+                first rejected lines with their error.
+        """
+        table_name = quote_identifier(copy_data['table_name'])
+        columns = [quote_identifier(column) for column in copy_data['columns']]
+        column_list = ', '.join(columns)
+        chunk_size = max(int(copy_data.get('chunk_size', 10000)), 1)
+        mode = copy_data.get('mode')
+        if mode is not None and mode not in MERGE_MODES:
+            raise ValueError(f"Invalid mode: {mode}. Expected one of {', '.join(MERGE_MODES)}")
+        key = [quote_identifier(column) for column in copy_data.get('key', ['id'])]
+        # Checked before any row is read, a bad key must not cost a full COPY into the staging table
+        if mode == 'upsert' and (not key or not set(key) <= set(columns)):
+            raise ValueError("Upsert key columns must be part of the imported columns")
+
+        report = {"rows_loaded": 0, "rows_rejected": 0, "rows_skipped": 0, "rejected": []}
+        cur = connection.cursor()
+
+        target = table_name
+        if mode is not None:
+            target = quote_identifier(f"import_stage_{uuid.uuid4().hex}")
+        copy_query = f"COPY {target} ({column_list}) FROM STDIN WITH (FORMAT csv)"
+
+        try:
+            if mode is not None:
+                # The staging table keeps the NOT NULL and CHECK constraints of the target table, so bad
+                # lines are rejected one by one by the COPY instead of aborting the whole merge
+                cur.execute(f"CREATE TEMP TABLE {target} (LIKE {table_name} INCLUDING CONSTRAINTS)")
+                self._relax_staging_columns(cur, target, columns)
+
+            copied = 0
+            chunk = []
+            for line_number, values in copy_data['rows']:
+                if isinstance(values, str):
+                    self._reject_row(report, line_number, values)
+                    continue
+                chunk.append((line_number, values))
+                if len(chunk) >= chunk_size:
+                    copied += self._copy_chunk(cur, copy_query, chunk, report)
+                    chunk = []
+            if chunk:
+                copied += self._copy_chunk(cur, copy_query, chunk, report)
+
+            if mode is None:
+                report['rows_loaded'] = copied
+            else:
+                with transaction.atomic():
+                    if mode == 'replace':
+                        cur.execute(f"DELETE FROM {table_name}")
+                    cur.execute(self._merge_query(mode, table_name, target, columns, key))
+                    report['rows_loaded'] = cur.rowcount
+                report['rows_skipped'] = copied - report['rows_loaded']
+
+            if '"id"' in columns:
+                self._sync_id_sequence(cur, table_name)
+
+            print(f"Import successful. {report['rows_loaded']} rows loaded, {report['rows_rejected']} rows rejected.")
+            notify_change(copy_data['table_name'], 'copy', report['rows_loaded'])
+
+        finally:
+            if mode is not None:
+                cur.execute(f"DROP TABLE IF EXISTS {target}")
+            cur.close()
+
+        return report
+
+    def _copy_chunk(self, cur, copy_query, chunk, report):
+        """
+        COPY one chunk of (line_number, values) in its own transaction.
+
+        When the chunk is refused the chunk is split in two halves and each half is retried,
+        so invalid lines are isolated and rejected without giving up on the valid ones.
+
+        Returns:
+        - int: Number of rows copied.
+        """
+        try:
+            with transaction.atomic():
+                cur.copy_expert(copy_query, rows_to_csv(values for _, values in chunk))
+            return len(chunk)
+        except psycopg2.DatabaseError as error:
+            if len(chunk) == 1:
+                self._reject_row(report, chunk[0][0], str(error).strip())
+                return 0
+            middle = len(chunk) // 2
+            return (self._copy_chunk(cur, copy_query, chunk[:middle], report)
+                    + self._copy_chunk(cur, copy_query, chunk[middle:], report))
+
+    def _relax_staging_columns(self, cur, staging_table, columns):
+        """
+        Drop NOT NULL from the staging columns that are not imported.
+
+        They stay NULL in the staging table and are filled by the defaults of the target table
+        during the merge.
+        """
+        cur.execute(
+            "SELECT attname FROM pg_attribute "
+            "WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped AND attnotnull",
+            [staging_table]
+        )
+        for (name,) in cur.fetchall():
+            column = '"' + name.replace('"', '""') + '"'
+            if column not in columns:
+                cur.execute(f"ALTER TABLE {staging_table} ALTER COLUMN {column} DROP NOT NULL")
+
+    def _reject_row(self, report, line_number, error):
+        report['rows_rejected'] += 1
+        if len(report['rejected']) < MAX_REPORTED_REJECTS:
+            report['rejected'].append({"line": line_number, "error": error})
+
+    def _merge_query(self, mode, table_name, staging_table, columns, key):
+        """
+        Build the statement merging the staging table into the target table.
+
+        The key is the list of quoted upsert key columns, already checked against the columns.
+        """
+        column_list = ', '.join(columns)
+        if mode != 'upsert':
+            conflict = " ON CONFLICT DO NOTHING" if mode == 'insert' else ""
+            return f"INSERT INTO {table_name} ({column_list}) SELECT {column_list} FROM {staging_table}{conflict}"
+
+        key_list = ', '.join(key)
+        updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in columns if column not in key)
+        action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        # Keep only the last staged row of each key, ON CONFLICT cannot update a row twice
+        return (
+            f"INSERT INTO {table_name} ({column_list}) "
+            f"SELECT DISTINCT ON ({key_list}) {column_list} FROM {staging_table} ORDER BY {key_list}, ctid DESC "
+            f"ON CONFLICT ({key_list}) {action}"
+        )
+
+    def _sync_id_sequence(self, cur, table_name):
+        """
+        Move the id sequence past the loaded ids, explicit ids do not advance it.
+        """
+        cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table_name])
+        sequence = cur.fetchone()[0]
+        if sequence is not None:
+            cur.execute(
+                f"SELECT setval(%s, MAX(id)) FROM {table_name} HAVING MAX(id) IS NOT NULL",
+                [sequence]
+            )
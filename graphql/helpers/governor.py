@@ -0,0 +1,273 @@
+import asyncio
+from contextlib import contextmanager
+from functools import wraps
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse
+
+from .db_graph_query import quote_identifier, is_query_canceled
+from .single_flight import in_process, single_flight
+
+
+# Milliseconds, 0 disables the timeout. Override with GRAPHQL_STATEMENT_TIMEOUTS in the settings.
+DEFAULT_STATEMENT_TIMEOUTS = {
+    'select': 15000,
+    'sync': 15000,
+    'search': 5000,
+    'insert': 30000,
+    'update': 30000,
+    'delete': 30000,
+    'import': 0,
+}
+
+
+class Refused(Exception):
+    """
+    A governed query that did not run to completion, answered with the status by governed_view.
+    """
+
+    status = 503
+    retry_after = None
+
+
+class Overloaded(Refused):
+    """
+    Raised when a model or a user already has the maximum number of queries in flight.
+    """
+
+    status = 429
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueryTimeout(Refused):
+    """
+    Raised when a query runs longer than the statement_timeout of its operation.
+    """
+
+    status = 504
+
+
+class QueryCancelled(Refused):
+    """
+    Raised when a query is cancelled because its client disconnected.
+    """
+
+    status = 503
+
+
+def statement_timeout(operation):
+    """
+    Return the statement_timeout, in milliseconds, applied to an operation.
+    """
+    timeouts = dict(DEFAULT_STATEMENT_TIMEOUTS, **getattr(settings, 'GRAPHQL_STATEMENT_TIMEOUTS', {}))
+    return int(timeouts.get(operation, timeouts['select']))
+
+
+def request_user_id(request):
+    user = getattr(request, 'user', None)
+    return user.id if user is not None and user.is_authenticated else None
+
+
+class RunningQuery():
+    """
+    A governed query of an ASGI request, with the single flight it leads if any.
+    """
+
+    def __init__(self, raw_connection, flight):
+        self.raw_connection = raw_connection
+        self.flight = flight
+        self.cancelled = False
+
+
+class Governor():
+    """
+    Admission control around the GraphQL helper.
+
+    Queries in flight are counted per model and per user, and a query over capacity fails fast
+    with Overloaded instead of queuing for a database connection. The limits are per process:
+    GRAPHQL_MAX_QUERIES_PER_MODEL and GRAPHQL_MAX_QUERIES_PER_USER. A counter is dropped as soon
+    as its last query ends, so only the keys with queries in flight are kept.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        # id(ASGI scope) -> RunningQuery of that request
+        self.running = {}
+
+    def _acquire(self, key, limit):
+        with self.lock:
+            count = self.in_flight.get(key, 0)
+            if count >= limit:
+                return False
+            self.in_flight[key] = count + 1
+            return True
+
+    def _release(self, key):
+        with self.lock:
+            count = self.in_flight.pop(key) - 1
+            if count:
+                self.in_flight[key] = count
+
+    @contextmanager
+    def slots(self, model=None, user_id=None):
+        """
+        Hold one in-flight slot for the model and one for the user, or raise Overloaded.
+
+        Raises:
+        - ValueError: If the model is not a valid table name.
+        """
+        retry_after = getattr(settings, 'GRAPHQL_RETRY_AFTER', 1)
+        limits = (
+            ('model', model and quote_identifier(model), getattr(settings, 'GRAPHQL_MAX_QUERIES_PER_MODEL', 8)),
+            ('user', user_id, getattr(settings, 'GRAPHQL_MAX_QUERIES_PER_USER', 4)),
+        )
+        acquired = []
+        try:
+            for kind, key, limit in limits:
+                if key is None or not limit:
+                    continue
+                if not self._acquire((kind, key), limit):
+                    raise Overloaded(f"Too many queries in flight for this {kind}, retry later", retry_after)
+                acquired.append((kind, key))
+            yield
+        finally:
+            for key in acquired:
+                self._release(key)
+
+    @contextmanager
+    def govern(self, operation, model, request=None, per_user=True):
+        """
+        Run a GraphQL helper call under admission control and the statement_timeout of the operation.
+
+        The helpers commit and close the connection themselves, so the timeout is set for the
+        session and reset afterwards rather than with SET LOCAL inside a transaction.
+        Under ASGI the query is cancelled when the client disconnects, see CancelOnDisconnect.
+
+        Raises:
+        - QueryTimeout, QueryCancelled: When the query is stopped by its timeout or by a cancel.
+        """
+        timeout = statement_timeout(operation)
+        with self.slots(model, request_user_id(request) if per_user else None):
+            with connection.cursor() as cur:
+                cur.execute("SET statement_timeout = %s", [timeout])
+            scope_id = id(request.scope) if hasattr(request, 'scope') else None
+            running = RunningQuery(connection.connection, in_process.current())
+            if scope_id is not None:
+                with self.lock:
+                    self.running.setdefault(scope_id, set()).add(running)
+            try:
+                yield
+            except Exception as error:
+                if not is_query_canceled(error):
+                    raise
+                if running.cancelled:
+                    raise QueryCancelled("The query was cancelled, its client disconnected") from error
+                raise QueryTimeout(f"The query ran longer than its {timeout} ms timeout") from error
+            finally:
+                if scope_id is not None:
+                    with self.lock:
+                        self.running.get(scope_id, set()).discard(running)
+                        if not self.running.get(scope_id):
+                            self.running.pop(scope_id, None)
+                # The helper may have closed the connection, a new one starts with the default anyway
+                if connection.connection is not None:
+                    try:
+                        with connection.cursor() as cur:
+                            cur.execute("RESET statement_timeout")
+                    except Exception:
+                        pass
+
+    def shared(self, operation, model, request, query, function):
+        """
+        Run a read through single flight under admission control.
+
+        Every caller holds its own user slot while it waits, so a follower never inherits the 429
+        of another user. The leader alone takes the model slot and runs under the timeout.
+
+        Parameters:
+        - query: The single flight key, see single_flight.
+        - function (callable): Runs the helper call.
+        """
+        def lead():
+            with self.govern(operation, model, request, per_user=False):
+                return function()
+
+        with self.slots(user_id=request_user_id(request)):
+            return single_flight(query, lead)
+
+    def cancel(self, scope):
+        """
+        Cancel the queries running for an ASGI request.
+
+        A query shared through single flight keeps running while followers wait for its result.
+        """
+        with self.lock:
+            running_queries = list(self.running.get(id(scope), ()))
+        for running in running_queries:
+            if running.flight is not None and not in_process.abandon(running.flight):
+                continue
+            running.cancelled = True
+            try:
+                running.raw_connection.cancel()
+            except Exception as error:
+                print(f"Error cancelling query: {error}")
+
+
+governor = Governor()
+
+
+def governed_view(view):
+    """
+    Turn Refused into its status (429 with a Retry-After header, 503 or 504), and an invalid
+    model name into a 400 before any slot is taken.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if 'model' in kwargs:
+            try:
+                quote_identifier(kwargs['model'])
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+        try:
+            return view(request, *args, **kwargs)
+        except Refused as e:
+            response = JsonResponse({'error': str(e)}, status=e.status)
+            if e.retry_after is not None:
+                response['Retry-After'] = str(e.retry_after)
+            return response
+    return wrapper
+
+
+class CancelOnDisconnect():
+    """
+    ASGI middleware cancelling the queries of a request whose client went away before the response ended.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        response_done = False
+
+        async def receive_wrapper():
+            message = await receive()
+            if message['type'] == 'http.disconnect' and not response_done:
+                await asyncio.get_running_loop().run_in_executor(None, governor.cancel, scope)
+            return message
+
+        async def send_wrapper(message):
+            nonlocal response_done
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                response_done = True
+            await send(message)
+
+        return await self.app(scope, receive_wrapper, send_wrapper)
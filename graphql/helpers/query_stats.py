@@ -0,0 +1,132 @@
+import atexit
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+
+# Column compared to something, e.g. `city = %s`, `"zipcode" IN (...)`, `created_at >= %s`
+PREDICATE_RE = re.compile(
+    r'(?<![\w."])"?([A-Za-z_][\w$]*)"?\s*'
+    r'(=|<>|!=|<=|>=|<|>|NOT\s+I?LIKE\b|I?LIKE\b|NOT\s+IN\b|IN\b|IS\b|BETWEEN\b)',
+    re.IGNORECASE
+)
+
+SQL_KEYWORDS = {'and', 'or', 'not', 'null', 'true', 'false', 'is', 'in', 'like', 'ilike', 'between'}
+
+EQUALITY_OPERATORS = {'=', 'in', 'is'}
+RANGE_OPERATORS = {'<', '>', '<=', '>=', 'between'}
+PATTERN_OPERATORS = {'like', 'ilike'}
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|%s|\b\d+(?:\.\d+)?\b")
+
+
+def normalize_condition(condition):
+    """
+    Normalize a WHERE condition so that queries differing only by their values are grouped.
+
+    Returns:
+    - str: The condition in lower case with literals and placeholders replaced by "?".
+    """
+    if not condition:
+        return ''
+    normalized = LITERAL_RE.sub('?', condition)
+    return ' '.join(normalized.split()).lower()
+
+
+def predicate_columns(condition):
+    """
+    Extract the columns a condition filters on, grouped by the kind of comparison.
+
+    Returns:
+    - dict: {"equality": [...], "range": [...], "pattern": [...]}, each list sorted.
+    """
+    found = {"equality": set(), "range": set(), "pattern": set()}
+    for column, operator in PREDICATE_RE.findall(condition or ''):
+        column = column.lower()
+        operator = ' '.join(operator.lower().split())
+        if column in SQL_KEYWORDS:
+            continue
+        if operator in EQUALITY_OPERATORS:
+            found['equality'].add(column)
+        elif operator in RANGE_OPERATORS:
+            found['range'].add(column)
+        elif operator in PATTERN_OPERATORS:
+            found['pattern'].add(column)
+    return {kind: sorted(columns) for kind, columns in found.items()}
+
+
+class QueryStatsRecorder():
+    """
+    Aggregate the predicates seen by select_from_table in memory and periodically flush them
+    to the graphql_querystat table, so recording never costs a write per request.
+    """
+
+    def __init__(self, flush_interval=60):
+        self.flush_interval = flush_interval
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+
+    def record(self, table_name, condition, order_by, elapsed):
+        """
+        Record one select on table_name that took elapsed seconds.
+        """
+        key = (table_name.lower(), normalize_condition(condition), ','.join(order_by or []).lower())
+        with self.lock:
+            calls, total_time, _ = self.pending.get(key, (0, 0.0, condition))
+            self.pending[key] = (calls + 1, total_time + elapsed, condition)
+            due = time.monotonic() - self.last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Add the pending counters to the graphql_querystat table.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+        if not pending:
+            return
+
+        rows = []
+        for (table_name, predicate, order_by), (calls, total_time, condition) in pending.items():
+            columns = predicate_columns(condition)
+            rows.append([
+                table_name, predicate, order_by,
+                ','.join(columns['equality']), ','.join(columns['range']), ','.join(columns['pattern']),
+                calls, total_time * 1000,
+            ])
+
+        values_template = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, now())'] * len(rows))
+        try:
+            with connection.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO graphql_querystat "
+                    "(table_name, predicate, order_by, equality_columns, range_columns, pattern_columns, "
+                    "calls, total_time_ms, last_seen) "
+                    f"VALUES {values_template} "
+                    "ON CONFLICT (table_name, predicate, order_by) DO UPDATE SET "
+                    "calls = graphql_querystat.calls + EXCLUDED.calls, "
+                    "total_time_ms = graphql_querystat.total_time_ms + EXCLUDED.total_time_ms, "
+                    "last_seen = EXCLUDED.last_seen",
+                    [value for row in rows for value in row]
+                )
+        except Exception as error:
+            print(f"Error saving query stats: {error}")
+
+
+recorder = QueryStatsRecorder(getattr(settings, 'GRAPHQL_QUERY_STATS_FLUSH_INTERVAL', 60))
+
+atexit.register(recorder.flush)
+
+
+def record_select(table_name, condition, order_by, elapsed):
+    """
+    Record a select_from_table call, unless GRAPHQL_QUERY_STATS is disabled in the settings.
+    """
+    if getattr(settings, 'GRAPHQL_QUERY_STATS', True):
+        recorder.record(table_name, condition, order_by, elapsed)
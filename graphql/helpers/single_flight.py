@@ -0,0 +1,142 @@
+from concurrent.futures import Future
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class Flight():
+    """
+    A call in progress, shared by its leader and its followers.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.future = Future()
+        self.followers = 0
+
+
+class SingleFlight():
+    """
+    Run a function once for all the concurrent callers asking for the same key.
+
+    The first caller (the leader) runs the function; callers arriving while it runs wait on
+    its future and share the result or the exception. Nothing is kept once the call is done,
+    this is not a cache.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def do(self, key, function):
+        with self.lock:
+            flight = self.calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.calls[key] = Flight(key)
+            else:
+                flight.followers += 1
+
+        if not leader:
+            return flight.future.result()
+
+        previous, self.local.flight = self.current(), flight
+        try:
+            result = function()
+        except BaseException as error:
+            flight.future.set_exception(error)
+            raise
+        else:
+            flight.future.set_result(result)
+            return result
+        finally:
+            self.local.flight = previous
+            with self.lock:
+                if self.calls.get(key) is flight:
+                    del self.calls[key]
+
+    def current(self):
+        """
+        Return the flight led by the current thread, None outside of a flight.
+        """
+        return getattr(self.local, 'flight', None)
+
+    def abandon(self, flight):
+        """
+        Detach a flight nobody follows, so that later callers start a new one.
+
+        Returns:
+        - bool: False when followers are waiting for the result of the flight.
+        """
+        with self.lock:
+            if flight.followers:
+                return False
+            if self.calls.get(flight.key) is flight:
+                del self.calls[flight.key]
+            return True
+
+
+in_process = SingleFlight()
+
+
+def _shared_do(key, function):
+    """
+    Cross-process single flight through the Django cache.
+
+    cache.add is atomic, the process that adds the lease key is the leader. The lease holds a
+    token and the leader publishes its result under that token, so only the callers that saw the
+    lease while the query ran get the result: a caller arriving once the lease is gone runs the
+    query again instead of reading a stale result. GRAPHQL_SINGLE_FLIGHT_TTL is only the time the
+    waiting callers have to pick the result up.
+    Needs a cache shared by the processes (Redis, Memcached, database), not the default LocMemCache.
+    """
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    lease_key = f"graphql:single-flight:lease:{digest}"
+    ttl = getattr(settings, 'GRAPHQL_SINGLE_FLIGHT_TTL', 1)
+    wait = getattr(settings, 'GRAPHQL_SINGLE_FLIGHT_WAIT', 30)
+
+    deadline = time.monotonic() + wait
+    leader = None
+    while True:
+        token = uuid.uuid4().hex
+        if cache.add(lease_key, token, wait):
+            try:
+                result = function()
+                cache.set(f"graphql:single-flight:result:{token}", result, ttl)
+                return result
+            finally:
+                cache.delete(lease_key)
+        leader = cache.get(lease_key) or leader
+        if time.monotonic() > deadline:
+            # The leader is too slow or died, do not wait any longer
+            return function()
+        time.sleep(0.02)
+        if leader is not None:
+            cached = cache.get(f"graphql:single-flight:result:{leader}")
+            if cached is not None:
+                return cached
+
+
+def single_flight(query, function):
+    """
+    Share the result of function between the identical concurrent queries.
+
+    Parameters:
+    - query: A JSON serializable description of the query (table, columns, condition, params, page, ...).
+    - function (callable): Runs the query.
+
+    Set GRAPHQL_SINGLE_FLIGHT = False to disable it, GRAPHQL_SINGLE_FLIGHT_SHARED = True to also
+    coalesce the queries of other processes through the Django cache.
+    """
+    if not getattr(settings, 'GRAPHQL_SINGLE_FLIGHT', True):
+        return function()
+    key = json.dumps(query, sort_keys=True, default=str)
+    if getattr(settings, 'GRAPHQL_SINGLE_FLIGHT_SHARED', False):
+        return in_process.do(key, lambda: _shared_do(key, function))
+    return in_process.do(key, function)
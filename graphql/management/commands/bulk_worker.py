@@ -0,0 +1,40 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from graphql.helpers.bulk_jobs import JOB_CHUNK_SIZE, JOB_STALE_AFTER, run_worker
+
+
+class Command(BaseCommand):
+    help = "Process the bulk write jobs queued by the graphQL view, with one or more worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help="Number of worker processes.")
+        parser.add_argument('--chunk-size', type=int, default=JOB_CHUNK_SIZE, help="Items applied per chunk.")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--stale-after', type=int, default=JOB_STALE_AFTER,
+                            help="Seconds without heartbeat after which a running job is reclaimed.")
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty.")
+
+    def handle(self, *args, **options):
+        worker_options = {
+            "chunk_size": options['chunk_size'],
+            "poll_interval": options['poll_interval'],
+            "stale_after": options['stale_after'],
+            "once": options['once'],
+        }
+        if options['processes'] <= 1:
+            run_worker(**worker_options)
+            return
+
+        # Every process must open its own database connection
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=run_worker, kwargs=worker_options)
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
@@ -0,0 +1,149 @@
+import hashlib
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from graphql.helpers.db_graph_query import order_by_clause, quote_identifier
+from graphql.helpers.query_stats import recorder
+from graphql.models import QueryStat
+
+
+INDEX_COLUMNS_RE = re.compile(r'USING \w+ \((.*)\)(?: INCLUDE \(.*\))?(?: WHERE .*)?$')
+
+
+def index_name(table_name, columns):
+    """
+    Build an index name that fits in the 63 characters PostgreSQL keeps.
+    """
+    name = f"{table_name.split('.')[-1]}_{'_'.join(column.lstrip('-') for column in columns)}_idx"
+    if len(name) > 63:
+        digest = hashlib.md5(name.encode()).hexdigest()[:8]
+        name = f"{name[:50]}_{digest}_idx"
+    return name.lower()
+
+
+def is_covered(equality, rest, existing):
+    """
+    Tell whether an existing index (list of columns) already serves the candidate index,
+    i.e. starts with the equality columns in any order followed by the other columns.
+    """
+    width = len(equality) + len(rest)
+    if len(existing) < width:
+        return False
+    return set(existing[:len(equality)]) == set(equality) and existing[len(equality):width] == rest
+
+
+class Command(BaseCommand):
+    help = (
+        "Recommend indexes from the predicates and sort orders recorded by select_from_table, "
+        "cross-checked with pg_indexes and pg_stat_user_tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-calls', type=int, default=10, help="Ignore predicates seen fewer times.")
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help="Ignore tables smaller than this, sequential scans are cheap there.")
+        parser.add_argument('--limit', type=int, default=20, help="Maximum number of recommendations.")
+        parser.add_argument('--apply', action='store_true', help="Run the CREATE INDEX CONCURRENTLY statements.")
+
+    def handle(self, *args, **options):
+        # Include what this process recorded but did not flush yet
+        recorder.flush()
+
+        candidates = {}
+        pattern_columns = {}
+        for stat in QueryStat.objects.filter(calls__gte=options['min_calls']):
+            equality = [column for column in stat.equality_columns.split(',') if column]
+            ranges = [column for column in stat.range_columns.split(',') if column]
+            order_by = [column for column in stat.order_by.split(',') if column]
+            # Equality columns first, then one range column, then the sort columns
+            rest = ranges[:1] + [column for column in order_by if column.lstrip('-') not in equality + ranges[:1]]
+            if stat.pattern_columns:
+                pattern_columns.setdefault(stat.table_name, set()).update(stat.pattern_columns.split(','))
+            if not equality and not rest:
+                continue
+            key = (stat.table_name, tuple(equality), tuple(rest))
+            calls, total_time = candidates.get(key, (0, 0.0))
+            candidates[key] = (calls + stat.calls, total_time + stat.total_time_ms)
+
+        recommendations = []
+        table_cache = {}
+        for (table_name, equality, rest), (calls, total_time) in candidates.items():
+            if table_name not in table_cache:
+                table_cache[table_name] = self.table_info(table_name)
+            info = table_cache[table_name]
+            if info is None or info['rows'] < options['min_rows']:
+                continue
+            plain_rest = [column.lstrip('-') for column in rest]
+            if any(is_covered(list(equality), plain_rest, existing) for existing in info['indexes']):
+                continue
+            scans = info['seq_scan'] + info['idx_scan']
+            seq_ratio = info['seq_scan'] / scans if scans else 1.0
+            recommendations.append({
+                "table_name": table_name,
+                "columns": list(equality) + list(rest),
+                "calls": calls,
+                "total_time_ms": total_time,
+                "seq_scan": info['seq_scan'],
+                "rows": info['rows'],
+                # Time spent on the predicate, weighted by how often the table is read sequentially
+                "benefit": total_time * seq_ratio,
+            })
+
+        recommendations.sort(key=lambda recommendation: recommendation['benefit'], reverse=True)
+        recommendations = recommendations[:options['limit']]
+
+        if not recommendations:
+            self.stdout.write("No index recommendation.")
+
+        for recommendation in recommendations:
+            columns = order_by_clause(recommendation['columns'])
+            statement = (
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote_identifier(index_name(recommendation['table_name'], recommendation['columns']))} "
+                f"ON {quote_identifier(recommendation['table_name'])} ({columns})"
+            )
+            self.stdout.write(
+                f"-- {recommendation['table_name']}: {recommendation['calls']} calls, "
+                f"{recommendation['total_time_ms']:.0f} ms, {recommendation['seq_scan']} seq scans, "
+                f"{recommendation['rows']} rows, estimated benefit {recommendation['benefit']:.0f}"
+            )
+            self.stdout.write(f"{statement};")
+            if options['apply']:
+                # CREATE INDEX CONCURRENTLY cannot run in a transaction, the connection is in autocommit
+                with connection.cursor() as cur:
+                    cur.execute(statement)
+                self.stdout.write(self.style.SUCCESS("Created."))
+
+        for table_name, columns in pattern_columns.items():
+            self.stdout.write(
+                f"-- {table_name}: LIKE/ILIKE predicates on {', '.join(sorted(columns))} cannot use a btree index."
+            )
+
+    def table_info(self, table_name):
+        """
+        Return the existing index columns and the scan statistics of a table, or None if it does not exist.
+        """
+        schema, _, relname = table_name.lower().rpartition('.')
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT seq_scan, COALESCE(idx_scan, 0), n_live_tup FROM pg_stat_user_tables "
+                "WHERE relname = %s AND schemaname = COALESCE(NULLIF(%s, ''), current_schema())",
+                [relname, schema]
+            )
+            row = cur.fetchone()
+            if row is None:
+                return None
+            cur.execute(
+                "SELECT indexdef FROM pg_indexes "
+                "WHERE tablename = %s AND schemaname = COALESCE(NULLIF(%s, ''), current_schema())",
+                [relname, schema]
+            )
+            indexes = []
+            for (indexdef,) in cur.fetchall():
+                match = INDEX_COLUMNS_RE.search(indexdef)
+                if match:
+                    indexes.append([
+                        part.strip().split(' ')[0].strip('"').lower() for part in match.group(1).split(',')
+                    ])
+        return {"seq_scan": row[0], "idx_scan": row[1], "rows": row[2], "indexes": indexes}
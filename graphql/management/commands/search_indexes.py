@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from graphql.helpers.db_graph_query import quote_identifier, search_columns, search_document
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the full-text (tsvector GIN) and trigram (pg_trgm GIN) indexes used by the search mode "
+        "of the graphQL view, for the tables of GRAPHQL_SEARCH_COLUMNS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tables', nargs='*', help="Tables to index, all the configured tables by default.")
+        parser.add_argument('--dry-run', action='store_true', help="Print the statements without running them.")
+
+    def handle(self, *args, **options):
+        tables = options['tables'] or list(getattr(settings, 'GRAPHQL_SEARCH_COLUMNS', {}))
+        statements = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"]
+        for table_name in tables:
+            table = quote_identifier(table_name)
+            relname = table.split('.')[-1].strip('"')
+            columns = search_columns(table_name)
+            index_name = quote_identifier(f"{relname}_search_fts_idx")
+            statements.append(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                f"ON {table} USING gin ({search_document(columns)})"
+            )
+            for column in columns:
+                column_name = column.strip('"')
+                index_name = quote_identifier(f"{relname}_{column_name}_trgm_idx")
+                statements.append(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                    f"ON {table} USING gin ({column} gin_trgm_ops)"
+                )
+
+        for statement in statements:
+            self.stdout.write(f"{statement};")
+            if not options['dry_run']:
+                # CREATE INDEX CONCURRENTLY cannot run in a transaction, the connection is in autocommit
+                with connection.cursor() as cur:
+                    cur.execute(statement)
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Search indexes ready for {', '.join(tables)}."))
@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from graphql.helpers.db_graph_query import quote_identifier
+from graphql.models import SyncTable
+
+
+# Statement level triggers: one INSERT ... SELECT per statement, whatever the number of rows
+TRIGGERS = {
+    'graphql_sync_insert': "AFTER INSERT ON {table} REFERENCING NEW TABLE AS new_rows",
+    'graphql_sync_update': "AFTER UPDATE ON {table} REFERENCING NEW TABLE AS new_rows",
+    'graphql_sync_delete': "AFTER DELETE ON {table} REFERENCING OLD TABLE AS old_rows",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Enable or disable the change log used by the incremental sync of the graphQL view (since=<token>), "
+        "and compact it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enable', nargs='+', default=[], metavar='TABLE', help="Start logging the changes of these tables.")
+        parser.add_argument('--disable', nargs='+', default=[], metavar='TABLE', help="Stop logging the changes of these tables.")
+        parser.add_argument('--no-backfill', action='store_true',
+                            help="Do not log the existing rows when enabling, a since=0 sync then only returns new changes.")
+        parser.add_argument('--compact', action='store_true',
+                            help="Remove superseded changes and the tombstones older than --tombstone-days.")
+        parser.add_argument('--tombstone-days', type=int, default=30,
+                            help="Age after which deletions are forgotten, older sync tokens then expire.")
+
+    def handle(self, *args, **options):
+        if not (options['enable'] or options['disable'] or options['compact']):
+            raise CommandError("Nothing to do, use --enable, --disable or --compact.")
+        for table_name in options['enable']:
+            self.enable(table_name, backfill=not options['no_backfill'])
+        for table_name in options['disable']:
+            self.disable(table_name)
+        if options['compact']:
+            self.compact(options['tombstone_days'])
+
+    def enable(self, table_name, backfill):
+        table = quote_identifier(table_name)
+        relname = table.split('.')[-1].strip('"')
+        with transaction.atomic(), connection.cursor() as cur:
+            for name, event in TRIGGERS.items():
+                cur.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+                cur.execute(
+                    f"CREATE TRIGGER {name} {event.format(table=table)} "
+                    "FOR EACH STATEMENT EXECUTE FUNCTION graphql_log_change()"
+                )
+            SyncTable.objects.get_or_create(table_name=relname)
+            if backfill:
+                cur.execute(
+                    "INSERT INTO graphql_changelog (table_name, row_id, op, xid, changed_at) "
+                    f"SELECT %s, id, 'I', pg_current_xact_id()::text::bigint, now() FROM {table}",
+                    [relname]
+                )
+                self.stdout.write(f"{relname}: {cur.rowcount} existing rows logged.")
+        self.stdout.write(self.style.SUCCESS(f"{relname}: change log enabled."))
+
+    def disable(self, table_name):
+        table = quote_identifier(table_name)
+        relname = table.split('.')[-1].strip('"')
+        with transaction.atomic(), connection.cursor() as cur:
+            for name in TRIGGERS:
+                cur.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+            cur.execute("DELETE FROM graphql_changelog WHERE table_name = %s", [relname])
+            SyncTable.objects.filter(table_name=relname).delete()
+        self.stdout.write(self.style.SUCCESS(f"{relname}: change log disabled."))
+
+    def compact(self, tombstone_days):
+        with connection.cursor() as cur:
+            # Only the last change of a row matters to any token that is still valid
+            cur.execute(
+                "DELETE FROM graphql_changelog older USING graphql_changelog newer "
+                "WHERE older.table_name = newer.table_name AND older.row_id = newer.row_id "
+                "AND (older.xid, older.id) < (newer.xid, newer.id)"
+            )
+            self.stdout.write(f"{cur.rowcount} superseded changes removed.")
+
+            for sync_table in SyncTable.objects.all():
+                with transaction.atomic():
+                    cur.execute(
+                        "WITH pruned AS ("
+                        "DELETE FROM graphql_changelog WHERE table_name = %s AND op = 'D' "
+                        "AND changed_at < now() - %s * interval '1 day' RETURNING xid"
+                        ") SELECT COUNT(*), MAX(xid) FROM pruned",
+                        [sync_table.table_name, tombstone_days]
+                    )
+                    count, last_xid = cur.fetchone()
+                    if last_xid is not None and last_xid + 1 > sync_table.pruned_before:
+                        sync_table.pruned_before = last_xid + 1
+                        sync_table.save(update_fields=['pruned_before'])
+                self.stdout.write(f"{sync_table.table_name}: {count} tombstones removed.")
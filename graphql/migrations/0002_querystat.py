@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('graphql', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.CharField(max_length=100)),
+                ('predicate', models.TextField()),
+                ('order_by', models.CharField(blank=True, default='', max_length=255)),
+                ('equality_columns', models.CharField(blank=True, default='', max_length=255)),
+                ('range_columns', models.CharField(blank=True, default='', max_length=255)),
+                ('pattern_columns', models.CharField(blank=True, default='', max_length=255)),
+                ('calls', models.BigIntegerField(default=0)),
+                ('total_time_ms', models.FloatField(default=0)),
+                ('last_seen', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('table_name', 'predicate', 'order_by'), name='graphql_querystat_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+from django.db import migrations, models
+
+
+LOG_CHANGE_FUNCTION = """
+CREATE OR REPLACE FUNCTION graphql_log_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO graphql_changelog (table_name, row_id, op, xid, changed_at)
+        SELECT TG_TABLE_NAME, id, 'D', pg_current_xact_id()::text::bigint, now() FROM old_rows;
+    ELSE
+        INSERT INTO graphql_changelog (table_name, row_id, op, xid, changed_at)
+        SELECT TG_TABLE_NAME, id, left(TG_OP, 1), pg_current_xact_id()::text::bigint, now() FROM new_rows;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('graphql', '0002_querystat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.CharField(max_length=100)),
+                ('row_id', models.BigIntegerField()),
+                ('op', models.CharField(max_length=1)),
+                ('xid', models.BigIntegerField()),
+                ('changed_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['table_name', 'xid', 'row_id'], name='graphql_changelog_key_idx'),
+                    models.Index(fields=['table_name', 'row_id'], name='graphql_changelog_row_idx'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='SyncTable',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.CharField(max_length=100, unique=True)),
+                ('enabled_at', models.DateTimeField(auto_now_add=True)),
+                ('pruned_before', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(LOG_CHANGE_FUNCTION, "DROP FUNCTION IF EXISTS graphql_log_change()"),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('graphql', '0003_changelog'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bulkjob',
+            name='operation',
+            field=models.CharField(choices=[('insert', 'Insert'), ('update', 'Update'), ('upsert', 'Upsert'), ('delete', 'Delete'), ('purge', 'Purge')], max_length=10),
+        ),
+    ]
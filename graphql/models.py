@@ -1,3 +1,102 @@
+from django.conf import settings
 from django.db import models
 
 # Create your models here.
+
+
+class BulkJob(models.Model):
+    """
+    A large write persisted by the graphQL view and processed in chunks by the bulk_worker command.
+    """
+
+    OPERATIONS = [
+        ('insert', 'Insert'),
+        ('update', 'Update'),
+        ('upsert', 'Upsert'),
+        ('delete', 'Delete'),
+        ('purge', 'Purge'),
+    ]
+
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    operation = models.CharField(max_length=10, choices=OPERATIONS)
+    table_name = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending')
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    result = models.JSONField(default=dict)
+    error = models.TextField(blank=True, default='')
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='graphql_bulkjob_status_idx'),
+        ]
+
+
+class QueryStat(models.Model):
+    """
+    Predicates and sort orders observed by select_from_table, aggregated per table.
+
+    Filled by helpers.query_stats and read by the index_advisor command.
+    """
+
+    table_name = models.CharField(max_length=100)
+    predicate = models.TextField()
+    order_by = models.CharField(max_length=255, blank=True, default='')
+    equality_columns = models.CharField(max_length=255, blank=True, default='')
+    range_columns = models.CharField(max_length=255, blank=True, default='')
+    pattern_columns = models.CharField(max_length=255, blank=True, default='')
+    calls = models.BigIntegerField(default=0)
+    total_time_ms = models.FloatField(default=0)
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['table_name', 'predicate', 'order_by'], name='graphql_querystat_unique'),
+        ]
+
+
+class ChangeLog(models.Model):
+    """
+    Row changes of the tables enabled for incremental sync, written by the graphql_log_change triggers.
+
+    xid is the id of the writing transaction: a sync token is a transaction horizon, every change
+    below it is committed, so changes are never skipped whatever the commit order. Pages are cut
+    on (xid, row_id), so a transaction changing many rows is returned over several pages.
+    """
+
+    table_name = models.CharField(max_length=100)
+    row_id = models.BigIntegerField()
+    op = models.CharField(max_length=1)
+    xid = models.BigIntegerField()
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['table_name', 'xid', 'row_id'], name='graphql_changelog_key_idx'),
+            models.Index(fields=['table_name', 'row_id'], name='graphql_changelog_row_idx'),
+        ]
+
+
+class SyncTable(models.Model):
+    """
+    A table whose changes are logged in ChangeLog.
+
+    pruned_before is the oldest sync token still valid once old tombstones have been removed.
+    """
+
+    table_name = models.CharField(max_length=100, unique=True)
+    enabled_at = models.DateTimeField(auto_now_add=True)
+    pruned_before = models.BigIntegerField(default=0)
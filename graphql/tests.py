@@ -1,3 +1,502 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import SimpleTestCase, override_settings
+
+from .helpers.bulk_import import iter_csv_rows, iter_ndjson_rows, rows_to_csv, to_copy_field
+from .helpers.change_feed import MAX_PAYLOAD_BYTES, OVERFLOW, SUBSCRIBER_QUEUE_SIZE, ChangeListener, notify_change
+from .helpers.db_graph_query import GraphQL, order_by_clause, parse_sync_token
+from .helpers.governor import Governor, Overloaded, QueryCancelled, QueryTimeout
+from .helpers.query_stats import normalize_condition, predicate_columns
+from .helpers.single_flight import SingleFlight, _shared_do, in_process
+
+
+class BulkImportTests(SimpleTestCase):
+
+    def test_csv_header_and_nulls(self):
+        columns, rows = iter_csv_rows(['name,city\n', 'Alice,""\n', 'Bob,Paris\n'])
+        self.assertEqual(columns, ['name', 'city'])
+        self.assertEqual(list(rows), [(2, ['Alice', None]), (3, ['Bob', 'Paris'])])
+
+    def test_csv_explicit_columns_without_header(self):
+        columns, rows = iter_csv_rows(['1,2\n'], columns=['a', 'b'], header=False)
+        self.assertEqual(columns, ['a', 'b'])
+        self.assertEqual(list(rows), [(1, ['1', '2'])])
+
+    def test_csv_wrong_field_count_is_rejected(self):
+        _, rows = iter_csv_rows(['a,b\n', '1\n', '1,2\n'])
+        self.assertEqual(list(rows), [(2, "Expected 2 values, got 1"), (3, ['1', '2'])])
+
+    def test_csv_without_columns(self):
+        with self.assertRaises(ValueError):
+            iter_csv_rows([], header=True)
+
+    def test_ndjson_columns_from_first_object(self):
+        columns, rows = iter_ndjson_rows(['{"a": 1, "b": "x"}\n', '\n', '{"a": 2}\n'])
+        self.assertEqual(columns, ['a', 'b'])
+        self.assertEqual(list(rows), [(1, [1, 'x']), (3, [2, None])])
+
+    def test_ndjson_invalid_lines_are_rejected(self):
+        _, rows = iter_ndjson_rows(['{"a": 1}\n', 'not json\n', '[1]\n'])
+        rows = list(rows)
+        self.assertEqual(rows[0], (1, [1]))
+        self.assertTrue(rows[1][1].startswith("Invalid JSON"))
+        self.assertEqual(rows[2], (3, "Expected a JSON object"))
+
+    def test_ndjson_first_line_must_be_an_object(self):
+        with self.assertRaises(ValueError):
+            iter_ndjson_rows(['[1, 2]\n'])
+
+    def test_to_copy_field(self):
+        self.assertEqual(to_copy_field(None), '')
+        self.assertEqual(to_copy_field(''), '""')
+        self.assertEqual(to_copy_field('say "hi"'), '"say ""hi"""')
+        self.assertEqual(to_copy_field(True), '"true"')
+        self.assertEqual(to_copy_field({"a": 1}), '"{""a"": 1}"')
+        self.assertEqual(to_copy_field(3), '"3"')
+
+    def test_rows_to_csv(self):
+        self.assertEqual(rows_to_csv([[1, None], ['a,b', '']]).read(), '"1",\n"a,b",""\n')
+
+
+class QueryStatsTests(SimpleTestCase):
+
+    def test_normalize_condition(self):
+        self.assertEqual(
+            normalize_condition("City = 'Paris'  AND zipcode IN (%s, %s) AND age > 18"),
+            "city = ? and zipcode in (?, ?) and age > ?"
+        )
+        self.assertEqual(normalize_condition(None), '')
+
+    def test_predicate_columns(self):
+        self.assertEqual(
+            predicate_columns('"city" = %s AND zipcode IN (%s) AND created_at >= %s AND street ILIKE %s AND deleted IS NULL'),
+            {"equality": ['city', 'deleted', 'zipcode'], "range": ['created_at'], "pattern": ['street']}
+        )
+
+
+class OrderByTests(SimpleTestCase):
+
+    def test_order_by_clause(self):
+        self.assertEqual(order_by_clause(["city", "-zipcode"]), '"city", "zipcode" DESC')
+        for order_by in ("city", [1], ["city name"]):
+            with self.subTest(order_by=order_by), self.assertRaises(ValueError):
+                order_by_clause(order_by)
+
+
+class AggregateQueryTests(SimpleTestCase):
+
+    def aggregate_query(self, spec, **select_data):
+        return GraphQL()._aggregate_query(dict(select_data, table_name='core_address', aggregate=spec))
+
+    def test_group_by_with_having_and_order(self):
+        query, params = self.aggregate_query({
+            "group_by": ["city"],
+            "aggregates": [{"function": "count", "alias": "total"}, {"function": "max", "column": "zipcode"}],
+            "having": [{"aggregate": "total", "operator": ">=", "value": 10}],
+            "order_by": ["-total", "city"],
+        }, condition="state = %s", params=["CA"])
+        self.assertEqual(
+            query,
+            'SELECT "city", COUNT(*) AS "total", MAX("zipcode") AS "max_zipcode" FROM "core_address" '
+            'WHERE state = %s GROUP BY "city" HAVING COUNT(*) >= %s ORDER BY "total" DESC, "city"'
+        )
+        self.assertEqual(params, ["CA", 10])
+
+    def test_invalid_specifications(self):
+        invalid = [
+            [],
+            {},
+            {"group_by": "city"},
+            {"group_by": ["city; drop table x"]},
+            {"aggregates": ["count"]},
+            {"aggregates": [{"function": "median", "column": "zipcode"}]},
+            {"aggregates": [{"function": "sum"}]},
+            {"aggregates": [{"function": "count", "alias": "x"}, {"function": "count", "alias": "x"}]},
+            {"aggregates": [{"function": "count", "alias": "n"}], "having": [1]},
+            {"aggregates": [{"function": "count", "alias": "n"}], "having": [{"aggregate": "m"}]},
+            {"aggregates": [{"function": "count", "alias": "n"}], "having": [{"aggregate": "n", "operator": "~"}]},
+            {"aggregates": [{"function": "count", "alias": "n"}], "having": [{"aggregate": "n", "value": [1]}]},
+            {"group_by": ["city"], "order_by": [1]},
+            {"group_by": ["city"], "order_by": ["state"]},
+        ]
+        for spec in invalid:
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                self.aggregate_query(spec)
+
+
+class SyncTokenTests(SimpleTestCase):
+
+    def test_parse_sync_token(self):
+        self.assertEqual(parse_sync_token(0), (0, None))
+        self.assertEqual(parse_sync_token("1234"), (1234, None))
+        self.assertEqual(parse_sync_token("1234:56"), (1234, 56))
+        for token in ("", "abc", "1:x"):
+            with self.subTest(token=token), self.assertRaises(ValueError):
+                parse_sync_token(token)
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_concurrent_callers_share_one_call(self):
+        flights = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def function():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 42
+
+        leader = threading.Thread(target=lambda: results.append(flights.do('key', function)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(flights.do('key', function))) for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        for _ in range(500):
+            if flights.calls['key'].followers == 3:
+                break
+            time.sleep(0.01)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, [42] * 4)
+        self.assertEqual(flights.calls, {})
+
+    def test_exception_is_shared_and_not_kept(self):
+        flights = SingleFlight()
+
+        def function():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            flights.do('key', function)
+        self.assertEqual(flights.do('key', lambda: 1), 1)
+
+    def test_abandon(self):
+        flights = SingleFlight()
+
+        def function():
+            flight = flights.current()
+            self.assertTrue(flights.abandon(flight))
+            self.assertNotIn('key', flights.calls)
+            return 1
+
+        self.assertEqual(flights.do('key', function), 1)
+        self.assertIsNone(flights.current())
+
+
+    def test_shared_result_only_reaches_concurrent_callers(self):
+        cache.clear()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def function():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return len(calls)
+
+        leader = threading.Thread(target=lambda: results.append(_shared_do('key', function)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(_shared_do('key', function)))
+        follower.start()
+        time.sleep(0.1)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        self.assertEqual(results, [1, 1])
+
+        # The lease is gone, a later caller runs the query instead of reading the old result
+        self.assertEqual(_shared_do('key', function), 2)
+
+class FakeCursor():
+    """
+    Cursor returning the rows of a list whose search_rank and id follow the keyset of the query.
+    """
+
+    def __init__(self, rows, queries):
+        self.rows = rows
+        self.queries = queries
+        self.description = [('id',), ('street',), ('search_rank',)]
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, query, params):
+        self.queries.append((query, params))
+        rows = self.rows
+        if '::real' in query:
+            last_rank, last_id = params[-2:]
+            rows = [row for row in rows if row[2] < last_rank or (row[2] == last_rank and row[0] > last_id)]
+        limit = int(query.rsplit('LIMIT', 1)[1])
+        self.result = rows[:limit]
+
+    def fetchall(self):
+        return self.result
+
+
+@override_settings(GRAPHQL_SEARCH_COLUMNS={'core_address': ['street', 'city']})
+class SearchTableTests(SimpleTestCase):
+
+    def setUp(self):
+        self.queries = []
+        # Sorted like ORDER BY search_rank DESC, id
+        rows = [(1, 'Main st', 0.9), (4, 'Main av', 0.5), (2, 'Mainz', 0.5), (3, 'Maine', 0.1)]
+        rows.sort(key=lambda row: (-row[2], row[0]))
+        patcher = mock.patch('graphql.helpers.db_graph_query.connection')
+        connection = patcher.start()
+        self.addCleanup(patcher.stop)
+        connection.cursor.side_effect = lambda: FakeCursor(rows, self.queries)
+
+    def test_cursor_round_trip(self):
+        gql = GraphQL()
+        seen, cursor = [], None
+        while True:
+            rows, cursor = gql.search_table({
+                "table_name": "core_address", "search": "main", "page_size": 2, "cursor": cursor,
+            })
+            seen.extend(row['id'] for row in rows)
+            if cursor is None:
+                break
+        self.assertEqual(seen, [1, 2, 4, 3])
+        self.assertIn('to_tsquery', self.queries[0][0])
+        self.assertEqual(self.queries[0][1][0], 'main:*')
+
+    def test_contains_mode_escapes_like_wildcards(self):
+        GraphQL().search_table({"table_name": "core_address", "search": "50%_off", "mode": "contains"})
+        query, params = self.queries[0]
+        self.assertIn('"street" ILIKE %s OR "city" ILIKE %s', query)
+        self.assertIn('%50\\%\\_off%', params)
+
+    def test_invalid_search(self):
+        gql = GraphQL()
+        with self.assertRaises(ValueError):
+            gql.search_table({"table_name": "core_address", "search": "main", "mode": "fuzzy"})
+        with self.assertRaises(ValueError):
+            gql.search_table({"table_name": "core_address", "search": "main", "cursor": "not-a-cursor"})
+        with self.assertRaises(ValueError):
+            gql.search_table({"table_name": "core_user", "search": "main"})
+
+
+class QueryCanceled(Exception):
+    pgcode = '57014'
+
+
+def canceled_error():
+    """
+    A statement_timeout or cancel error as re-raised by Django, psycopg2's error as the cause.
+    """
+    error = OperationalError("canceling statement due to statement timeout")
+    error.__cause__ = QueryCanceled()
+    return error
+
+
+def fake_request(user_id):
+    return SimpleNamespace(user=SimpleNamespace(id=user_id, is_authenticated=True), scope={})
+
+
+@override_settings(GRAPHQL_MAX_QUERIES_PER_MODEL=2, GRAPHQL_MAX_QUERIES_PER_USER=1)
+class GovernorTests(SimpleTestCase):
+
+    def setUp(self):
+        self.governor = Governor()
+        patcher = mock.patch('graphql.helpers.governor.connection')
+        self.connection = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.raw_connection = self.connection.connection
+
+    def test_slots_are_counted_and_dropped(self):
+        with self.governor.slots('Core_Address', 1):
+            with self.governor.slots('core_address', 2):
+                self.assertEqual(self.governor.in_flight, {
+                    ('model', '"core_address"'): 2, ('user', 1): 1, ('user', 2): 1,
+                })
+                with self.assertRaises(Overloaded):
+                    with self.governor.slots('core_address'):
+                        pass
+            with self.assertRaises(Overloaded):
+                with self.governor.slots(user_id=1):
+                    pass
+        self.assertEqual(self.governor.in_flight, {})
+
+    def test_invalid_model(self):
+        with self.assertRaises(ValueError):
+            with self.governor.slots('core_address; drop table x'):
+                pass
+        self.assertEqual(self.governor.in_flight, {})
+
+    def test_user_over_quota_does_not_affect_other_users(self):
+        with self.governor.slots(user_id=1):
+            with self.assertRaises(Overloaded):
+                self.governor.shared('select', 'core_address', fake_request(1), {'q': 'quota'}, lambda: 1)
+            self.assertEqual(self.governor.shared('select', 'core_address', fake_request(2), {'q': 'quota'}, lambda: 2), 2)
+
+    def test_timeout(self):
+        def function():
+            raise canceled_error()
+
+        with self.assertRaises(QueryTimeout):
+            self.governor.shared('select', 'core_address', fake_request(1), {'q': 'timeout'}, function)
+        self.assertEqual(self.governor.running, {})
+        self.assertEqual(self.governor.in_flight, {})
+
+    def test_disconnect_cancels_a_query_nobody_follows(self):
+        request = fake_request(1)
+
+        def function():
+            self.governor.cancel(request.scope)
+            raise canceled_error()
+
+        with self.assertRaises(QueryCancelled):
+            self.governor.shared('select', 'core_address', request, {'q': 'cancel'}, function)
+        self.raw_connection.cancel.assert_called_once_with()
+
+    def test_disconnect_keeps_a_query_followers_wait_for(self):
+        leader_request = fake_request(1)
+        query = {'q': 'followed'}
+        started, release = threading.Event(), threading.Event()
+        results = []
+
+        def function():
+            started.set()
+            release.wait(5)
+            return 'rows'
+
+        leader = threading.Thread(target=lambda: results.append(
+            self.governor.shared('select', 'core_address', leader_request, query, function)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(
+            self.governor.shared('select', 'core_address', fake_request(2), query, function)))
+        follower.start()
+        key = '{"q": "followed"}'
+        for _ in range(500):
+            if in_process.calls[key].followers == 1:
+                break
+            time.sleep(0.01)
+
+        self.governor.cancel(leader_request.scope)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.raw_connection.cancel.assert_not_called()
+        self.assertEqual(results, ['rows', 'rows'])
+
+
+class CanceledWriteTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch('graphql.helpers.db_graph_query.connection')
+        connection = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cursor = connection.cursor.return_value
+
+    def test_canceled_writes_are_raised(self):
+        self.cursor.execute.side_effect = canceled_error()
+        gql = GraphQL()
+        with self.assertRaises(OperationalError):
+            gql.insert_into_table({"table_name": "core_address", "columns": ["city"], "values": [["Paris"]]})
+        with self.assertRaises(OperationalError):
+            gql.update_table({"table_name": "core_address", "set_values": {"city": "Paris"}, "condition": "id = 1"})
+        with self.assertRaises(OperationalError):
+            gql.delete_from_table({"table_name": "core_address", "condition": "id = 1"})
+
+    def test_other_errors_are_still_reported(self):
+        self.cursor.execute.side_effect = OperationalError("syntax error")
+        gql = GraphQL()
+        self.assertEqual(gql.update_table({"table_name": "core_address", "set_values": {"city": "Paris"}, "condition": "x"}), 0)
+        self.assertEqual(gql.delete_from_table({"table_name": "core_address", "condition": "x"}), 0)
+
+
+class ChangeFeedTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch('graphql.helpers.change_feed.connection')
+        self.connection = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.connection.in_atomic_block = False
+        self.cursor = self.connection.cursor.return_value.__enter__.return_value
+
+    def payload(self):
+        return json.loads(self.cursor.execute.call_args[0][1][1])
+
+    def test_ids_are_sent_while_the_payload_fits(self):
+        notify_change('core_address', 'insert', 2, [1, 2])
+        self.assertEqual(self.payload(), {"table": "core_address", "op": "insert", "count": 2, "ids": [1, 2]})
+
+    def test_ids_are_dropped_over_the_payload_limit(self):
+        ids = [f"{i:036d}" for i in range(200)]
+        notify_change('core_address', 'insert', len(ids), ids)
+        self.assertLess(len(self.cursor.execute.call_args[0][1][1].encode()), MAX_PAYLOAD_BYTES)
+        self.assertEqual(self.payload(), {"table": "core_address", "op": "insert", "count": 200})
+
+    def test_savepoint_inside_a_transaction(self):
+        self.connection.in_atomic_block = True
+        with mock.patch('graphql.helpers.change_feed.transaction.atomic') as atomic:
+            self.cursor.execute.side_effect = OperationalError("payload string too long")
+            notify_change('core_address', 'delete', 1)
+        atomic.assert_called_once_with()
+        atomic.return_value.__exit__.assert_called_once()
+
+    def test_slow_subscriber_gets_an_overflow_marker(self):
+        async def fill():
+            listener = ChangeListener()
+            listener.conn = mock.Mock()
+            queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+            listener.subscribers['core_address'] = {queue}
+            listener.conn.notifies = [
+                SimpleNamespace(payload=json.dumps({"table": "core_address", "count": i}))
+                for i in range(SUBSCRIBER_QUEUE_SIZE + 1)
+            ]
+            listener._on_readable()
+            return [queue.get_nowait() for _ in range(queue.qsize())]
+
+        events = asyncio.run(fill())
+        self.assertIs(events[0], OVERFLOW)
+        self.assertEqual(events[1:], [{"table": "core_address", "count": SUBSCRIBER_QUEUE_SIZE}])
+
+
+class CopyIntoTableTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch('graphql.helpers.db_graph_query.connection')
+        connection = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cursor = connection.cursor.return_value
+
+    def test_upsert_key_checked_before_reading_rows(self):
+        def rows():
+            raise AssertionError("rows read before the key was checked")
+            yield
+
+        with self.assertRaises(ValueError):
+            GraphQL().copy_into_table({
+                "table_name": "core_address", "columns": ["city"], "rows": rows(), "mode": "upsert", "key": ["id"],
+            })
+        self.cursor.execute.assert_not_called()
+
+    def test_staging_table_dropped_when_its_setup_fails(self):
+        self.cursor.fetchall.side_effect = OperationalError("relation does not exist")
+        with self.assertRaises(OperationalError):
+            GraphQL().copy_into_table({"table_name": "core_address", "columns": ["city"], "rows": [], "mode": "insert"})
+        queries = [call[0][0] for call in self.cursor.execute.call_args_list]
+        self.assertTrue(queries[0].startswith("CREATE TEMP TABLE"))
+        self.assertTrue(queries[-1].startswith("DROP TABLE IF EXISTS"))
+        self.cursor.close.assert_called_once_with()
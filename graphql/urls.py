@@ -1,8 +1,12 @@
 from django.urls import path, include 
-from .views import graphQL
+from .views import graphQL, bulkImport, bulkJob, bulkJobStatus, changeFeed
 from rest_framework.routers import DefaultRouter
 
 urlpatterns = [
-    path('<model>', graphQL, name="graph-ql")
+    path('<model>', graphQL, name="graph-ql"),
+    path('import/<model>', bulkImport, name="graph-ql-import"),
+    path('jobs/status/<int:job_id>', bulkJobStatus, name="graph-ql-job-status"),
+    path('jobs/<model>', bulkJob, name="graph-ql-job"),
+    path('changes/<model>', changeFeed, name="graph-ql-changes"),
 ]
  
\ No newline at end of file
@@ -1,23 +1,94 @@
+import asyncio
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.db import DatabaseError
+from django.http import JsonResponse, StreamingHttpResponse
 from .helpers.db_graph_query import GraphQL
+from .helpers.bulk_import import iter_text_lines, iter_csv_rows, iter_ndjson_rows
+from .helpers.bulk_jobs import enqueue_job, job_status
+from .helpers.change_feed import OVERFLOW, change_listener
+from .helpers.governor import governor, governed_view, Refused
+from .helpers.db_graph_query import quote_identifier, SyncTokenExpired
+from .models import BulkJob
 from django.views.decorators.csrf import csrf_exempt
 import json
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.exceptions import AuthenticationFailed
+from core.authentication import CachedJWTAuthentication
 # Create your views here.
 
 
 @csrf_exempt
-@api_view(['GET', 'POST', 'PUT'])
+@api_view(['GET', 'POST', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@governed_view
 def graphQL(request, model):
     
     """
     """
     gql = GraphQL()
     body = json.loads(request.body) if request.body else None 
+    if request.method in ("POST", "PUT", "DELETE") and request.GET.get("async") in ("1", "true"):
+        # Large writes are queued and processed by the bulk_worker command
+        operation = {"POST": "insert", "PUT": "update", "DELETE": "purge"}[request.method]
+        try:
+            job = enqueue_job(operation, model, body, request.user)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse(job_status(job), status=202)
+
+    if request.method == "GET" and request.GET.get("search") != None:
+        # Indexed full-text / trigram search on the columns of GRAPHQL_SEARCH_COLUMNS
+        data = {}
+        data['table_name'] = model
+        data['search'] = request.GET.get("search")
+        if request.GET.get("mode") != None :
+            data['mode'] = request.GET.get("mode")
+        if request.GET.get("columns") != None :
+            data['columns'] = json.loads(request.GET.get("columns"))
+        if  request.GET.get("condition") != None and request.GET.get("params") != None :
+            data['condition'] = request.GET.get("condition")
+            data['params'] = json.loads(request.GET.get("params"))
+        if request.GET.get("page_size") != None :
+            data['page_size'] = request.GET.get("page_size")
+        if request.GET.get("cursor") != None :
+            data['cursor'] = request.GET.get("cursor")
+
+        try:
+            result, next_cursor = governor.shared("search", model, request, data, lambda: gql.search_table(data))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({
+            "datas": result,
+            "next_cursor": next_cursor,
+        })
+
+    if request.method == "GET" and request.GET.get("since") != None:
+        # Incremental sync: only the rows changed since the token, plus tombstones
+        data = {}
+        data['table_name'] = model
+        data['since'] = request.GET.get("since")
+        if request.GET.get("columns") != None :
+            data['columns'] = json.loads(request.GET.get("columns"))
+        if request.GET.get("limit") != None :
+            data['limit'] = request.GET.get("limit")
+
+        try:
+            with governor.govern("sync", model, request):
+                result, deleted, sync_token, has_more = gql.select_changes_since(data)
+        except SyncTokenExpired as e:
+            return JsonResponse({'error': str(e)}, status=410)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({
+            "datas": result,
+            "deleted": deleted,
+            "sync_token": sync_token,
+            "has_more": has_more,
+        })
+
     if request.method == "GET": 
         data = {}
         data['table_name'] = model
@@ -29,11 +100,21 @@ def graphQL(request, model):
             data['condition'] = request.GET.get("condition")
             data['params'] = json.loads(request.GET.get("params"))
 
+        if request.GET.get("order_by") != None :
+            data['order_by'] = json.loads(request.GET.get("order_by"))
+
+        if request.GET.get("aggregate") != None :
+            data['aggregate'] = json.loads(request.GET.get("aggregate"))
+
         if request.GET.get("page_number") != None and  request.GET.get('page_size') != None :
             data['page_size'] = int(request.GET.get('page_size'))
             data['page_number'] = int(request.GET.get("page_number"))
 
-        result, total_rows, total_pages = gql.select_from_table(data)
+        try:
+            # Identical concurrent reads share a single execution
+            result, total_rows, total_pages = governor.shared("select", model, request, data, lambda: gql.select_from_table(data))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         return JsonResponse({ 
             "datas": result,
             "total_rows": total_rows, 
@@ -42,14 +123,167 @@ def graphQL(request, model):
     elif request.method == "POST":
         data = body
         data['table_name'] = model
-        result = gql.insert_into_table(data)
+        with governor.govern("insert", model, request):
+            result = gql.insert_into_table(data)
         return JsonResponse({  
             "datas": result
         })
     elif request.method == "PUT":
         data = body
         data['table_name'] = model
-        result = gql.update_table(data)
+        with governor.govern("update", model, request):
+            result = gql.update_table(data)
+        return JsonResponse({ 
+            "datas": result
+        })
+    elif request.method == "DELETE":
+        # Deleted in bounded batches, committed one by one, see GraphQL.delete_in_batches
+        data = body or {}
+        data['table_name'] = model
+        try:
+            with governor.govern("delete", model, request):
+                result = gql.delete_in_batches(data)
+        except (ValueError, DatabaseError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
         return JsonResponse({ 
             "datas": result
-        })
\ No newline at end of file
+        })
+
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonlines', 'application/jsonl')
+
+
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@governed_view
+def bulkImport(request, model):
+    """
+    Stream a CSV or NDJSON body into a table with COPY ... FROM STDIN.
+
+    The body is read line by line and never loaded entirely in memory.
+    Query parameters:
+    - format: "csv" or "ndjson" (defaults to the request content type, then csv).
+    - columns: JSON list of target columns (defaults to the CSV header or the first NDJSON object keys).
+    - header: "false" when the CSV body has no header line.
+    - chunk_size: Number of rows sent per COPY (default 10000).
+    - mode: "insert", "upsert" or "replace" to load through a staging table and merge it.
+    - key: JSON list of the upsert conflict columns (default ["id"]).
+    """
+    gql = GraphQL()
+    data = {}
+    data['table_name'] = model
+
+    try:
+        columns = json.loads(request.GET.get("columns")) if request.GET.get("columns") != None else None
+        import_format = request.GET.get("format")
+        if import_format == None:
+            import_format = "ndjson" if request.content_type in NDJSON_CONTENT_TYPES else "csv"
+
+        lines = iter_text_lines(request._request)
+        if import_format == "csv":
+            header = request.GET.get("header", "true").lower() != "false"
+            data['columns'], data['rows'] = iter_csv_rows(lines, columns, header)
+        elif import_format == "ndjson":
+            data['columns'], data['rows'] = iter_ndjson_rows(lines, columns)
+        else:
+            return JsonResponse({'error': f"Invalid format: {import_format}"}, status=400)
+
+        if request.GET.get("chunk_size") != None:
+            data['chunk_size'] = int(request.GET.get("chunk_size"))
+        if request.GET.get("mode") != None:
+            data['mode'] = request.GET.get("mode")
+        if request.GET.get("key") != None:
+            data['key'] = json.loads(request.GET.get("key"))
+
+        with governor.govern("import", model, request):
+            result = gql.copy_into_table(data)
+    except Refused:
+        raise
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse(result)
+
+
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulkJob(request, model):
+    """
+    Queue a bulk write on a table and return the job id immediately.
+
+    The body holds the operation ("insert", "update", "upsert" or "delete") and its payload,
+    see helpers.bulk_jobs.enqueue_job.
+    """
+    body = json.loads(request.body) if request.body else {}
+    try:
+        operation = body.pop('operation', None)
+        job = enqueue_job(operation, model, body, request.user)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(job_status(job), status=202)
+
+
+@csrf_exempt
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def bulkJobStatus(request, job_id):
+    """
+    Return the status and progress of a bulk job queued by the current user.
+    """
+    job = BulkJob.objects.filter(id=job_id).first()
+    if job is None or (job.owner_id != request.user.id and not request.user.is_staff):
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    return JsonResponse(job_status(job))
+
+
+CHANGE_FEED_KEEPALIVE = 25
+
+
+@csrf_exempt
+async def changeFeed(request, model):
+    """
+    Server-Sent Events stream of the row changes of a table ("*" for every table).
+
+    Needs the ASGI application (erp/asgi.py): the connection is held by the event loop and
+    every subscriber of the process shares the same LISTEN connection.
+    """
+    try:
+        auth = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as e:
+        return JsonResponse({'error': str(e)}, status=401)
+    if auth is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided.'}, status=401)
+
+    table_name = model.lower()
+    if table_name != "*":
+        try:
+            quote_identifier(table_name)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+    queue = change_listener.subscribe(table_name)
+
+    async def events():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=CHANGE_FEED_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Comment line keeping proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is OVERFLOW:
+                    # Events were dropped, the client must resync the table from its sync token
+                    yield f"event: overflow\ndata: {json.dumps({'table': table_name})}\n\n"
+                    continue
+                yield f"event: change\ndata: {json.dumps(event)}\n\n"
+        finally:
+            change_listener.unsubscribe(table_name, queue)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response['Cache-Control'] = "no-cache"
+    response['X-Accel-Buffering'] = "no"
+    return response